@@ -0,0 +1 @@
+"""Execution-layer scripts for the email assistant workflow."""
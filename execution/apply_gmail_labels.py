@@ -8,11 +8,16 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 import os
+import gzip
 import json
+from collections import defaultdict
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+# Gmail allows up to 1000 message IDs per batchModify call
+BATCH_MODIFY_LIMIT = 1000
+
 # Label mapping
 LABEL_MAP = {
     'advertising': 'Email-Assistant/Advertising',
@@ -31,10 +36,14 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 Load categorized emails."""
+    if not os.path.exists(cache_path) and os.path.exists(cache_path + '.gz'):
+        cache_path += '.gz'
+
     if not os.path.exists(cache_path):
         raise FileNotFoundError(f"Categorization results not found at {cache_path}")
 
-    with open(cache_path, 'r', encoding='utf-8') as f:
+    opener = gzip.open if cache_path.endswith('.gz') else open
+    with opener(cache_path, 'rt', encoding='utf-8') as f:
         data = json.load(f)
 
     return data['emails']
@@ -49,27 +58,27 @@ def get_gmail_service():
     creds = Credentials.from_authorized_user_file(token_path)
     return build('gmail', 'v1', credentials=creds)
 
-def get_or_create_label(service, label_path):
+def list_label_ids(service):
+    """Fetch all existing labels once and map name -> ID."""
+    results = service.users().labels().list(userId='me').execute()
+    return {label['name']: label['id'] for label in results.get('labels', [])}
+
+def get_or_create_label(service, label_path, existing_labels):
     """
     Get existing label or create if it doesn't exist.
 
     Args:
         service: Gmail API service
         label_path: Hierarchical label path (e.g., 'Email-Assistant/Invoice')
+        existing_labels: Dict of label name -> ID from list_label_ids
 
     Returns:
         Label ID
     """
-    try:
-        # List all labels
-        results = service.users().labels().list(userId='me').execute()
-        labels = results.get('labels', [])
-
-        # Check if label exists
-        for label in labels:
-            if label['name'] == label_path:
-                return label['id']
+    if label_path in existing_labels:
+        return existing_labels[label_path]
 
+    try:
         # Label doesn't exist, create it
         print(f"  Creating label: {label_path}")
 
@@ -84,6 +93,7 @@ def get_or_create_label(service, label_path):
             body=label_object
         ).execute()
 
+        existing_labels[label_path] = created_label['id']
         return created_label['id']
 
     except HttpError as error:
@@ -117,53 +127,73 @@ def apply_gmail_labels(emails):
     """
     service = get_gmail_service()
 
-    # Get or create all label IDs
+    # Get or create all label IDs (one labels().list call for all categories)
     print("Setting up Gmail labels...")
+    existing_labels = list_label_ids(service)
     label_ids = {}
 
     for category, label_path in LABEL_MAP.items():
-        label_id = get_or_create_label(service, label_path)
+        label_id = get_or_create_label(service, label_path, existing_labels)
         if label_id:
             label_ids[category] = label_id
 
     print(f"✓ {len(label_ids)} labels ready\n")
 
-    # Apply labels to emails
+    # Group message IDs by category so each label is applied with a few
+    # batchModify calls instead of one modify round-trip per email
     label_counts = {cat: 0 for cat in LABEL_MAP.keys()}
     errors = []
+    by_category = defaultdict(list)
+    email_index = {email['id']: email for email in emails}
 
-    for i, email in enumerate(emails, 1):
+    for email in emails:
         category = email.get('category', 'other')
-        subject = email['subject'][:50]
-
-        print(f"Labeling {i}/{len(emails)}: {subject}...", end='\r')
 
         # Skip if already has Email-Assistant label (avoid reprocessing)
-        existing_labels = email.get('labelIds', [])
+        existing = email.get('labelIds', [])
         has_assistant_label = any(
-            'Email-Assistant' in label for label in existing_labels
+            'Email-Assistant' in label for label in existing
         )
 
         if has_assistant_label:
-            print(f"Labeling {i}/{len(emails)}: {subject} [SKIP - already labeled]")
+            print(f"Skipping already-labeled: {email['subject'][:50]}")
             continue
 
-        # Apply label
-        label_id = label_ids.get(category)
+        if label_ids.get(category):
+            by_category[category].append(email['id'])
 
-        if label_id:
-            success = apply_label_to_email(service, email['id'], label_id)
+    for category, ids in by_category.items():
+        label_id = label_ids[category]
 
-            if success:
-                label_counts[category] += 1
-            else:
-                errors.append({
-                    'email_id': email['id'],
-                    'subject': email['subject'],
-                    'category': category
-                })
+        for start in range(0, len(ids), BATCH_MODIFY_LIMIT):
+            chunk = ids[start:start + BATCH_MODIFY_LIMIT]
+            print(f"Labeling {len(chunk)} emails as {LABEL_MAP[category]}...")
 
-    print(f"\n\n✓ Label application complete!")
+            try:
+                service.users().messages().batchModify(
+                    userId='me',
+                    body={'ids': chunk, 'addLabelIds': [label_id]}
+                ).execute()
+
+                label_counts[category] += len(chunk)
+
+            except HttpError as error:
+                # Batch rejected - fall back to per-message modify so one
+                # bad ID doesn't fail the whole chunk
+                print(f"  Batch modify failed ({error}), retrying individually...")
+
+                for email_id in chunk:
+                    if apply_label_to_email(service, email_id, label_id):
+                        label_counts[category] += 1
+                    else:
+                        email = email_index[email_id]
+                        errors.append({
+                            'email_id': email_id,
+                            'subject': email['subject'],
+                            'category': category
+                        })
+
+    print(f"\n✓ Label application complete!")
 
     summary = {
         'total_processed': len(emails),
@@ -194,13 +224,15 @@ def save_labeling_report(summary, errors):
     if errors:
         print(f"\n⚠️  {len(errors)} errors occurred (see .tmp/labeling_report.json)")
 
-if __name__ == '__main__':
-    # Load categorized emails
-    emails = load_categorized_emails()
-    print(f"Loaded {len(emails)} categorized emails.\n")
+def run(emails=None):
+    """Apply Gmail labels (loading the cache when none are passed)."""
+    if emails is None:
+        emails = load_categorized_emails()
+        print(f"Loaded {len(emails)} categorized emails.\n")
 
-    # Apply labels
     summary, errors = apply_gmail_labels(emails)
-
-    # Save report
     save_labeling_report(summary, errors)
+    return summary
+
+if __name__ == '__main__':
+    run()
@@ -9,11 +9,32 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
 
 import os
 import sys
+import gzip
 import json
-from anthropic import Anthropic
-from openai import OpenAI
+import asyncio
+import hashlib
+import httpx
+from anthropic import AsyncAnthropic
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+    import onnxruntime
+except ImportError:
+    np = None
+    onnxruntime = None
+
 # Set UTF-8 encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -21,6 +42,27 @@ if sys.platform == 'win32':
 # Load environment variables
 load_dotenv()
 
+# Max in-flight LLM requests (respects provider rate limits)
+CONCURRENCY = 20
+
+# Emails per LLM call; amortizes the shared category-list prompt.
+# Larger batches cut cost/latency further but degrade accuracy.
+BATCH_SIZE = int(os.getenv('CATEGORIZE_BATCH_SIZE', '10'))
+
+# Bump when the categorization prompt changes to invalidate cached results
+PROMPT_VERSION = 'v1'
+CACHE_DIR = '.tmp/cat_cache'
+
+# Optional local int8 classifier, trained by self-distillation from
+# previous categorization_results.json runs - see
+# execution/train_category_classifier.py. When present, easy emails
+# are classified locally and only low-confidence ones escalate to the
+# LLM. Lives outside .tmp/ so cache cleanups don't wipe it.
+LOCAL_CLASSIFIER_PATH = os.getenv('CATEGORY_CLASSIFIER_PATH',
+                                  'models/category_classifier.onnx')
+LOCAL_CLASSIFIER_THRESHOLD = 0.85
+LOCAL_FEATURE_DIM = 2 ** 14
+
 CATEGORIES = {
     'advertising': 'Marketing, promotional content, newsletters, spam',
     'invoice': 'Bills, invoices, payment requests, receipts, financial statements',
@@ -30,6 +72,45 @@ CATEGORIES = {
     'other': 'Everything else that doesn\'t fit the above categories'
 }
 
+# High-precision markers for the rule-based pre-filter. Emails matching
+# these skip the LLM entirely; anything ambiguous still goes to the LLM.
+INVOICE_SUBJECT_HINTS = (
+    'invoice', 'receipt', 'payment confirmation', 'billing statement'
+)
+INVOICE_SENDER_HINTS = (
+    'billing@', 'invoices@', 'accounting@', 'payments@', 'finance@'
+)
+ADVERTISING_HINTS = (
+    'unsubscribe', 'newsletter', 'view this email in your browser',
+    'special offer', 'promo code', 'limited time'
+)
+ADVERTISING_SENDER_HINTS = (
+    'newsletter@', 'marketing@', 'mailer@', 'promotions@'
+)
+
+# Built once at import; identical across every call
+CATEGORIES_LIST = '\n'.join([f"- {k}: {v}" for k, v in CATEGORIES.items()])
+
+# Static instruction blocks sent as the system prompt. Keeping them
+# byte-identical across calls lets the providers cache the prefix
+# (Anthropic ephemeral cache_control / OpenAI automatic prefix caching).
+SYSTEM_PROMPT_SINGLE = f"""You are an email categorization assistant. Categorize the email provided by the user into ONE of these categories:
+
+{CATEGORIES_LIST}
+
+Respond with ONLY the category name (e.g., "invoice" or "new_client_inquiry"). No explanations."""
+
+SYSTEM_PROMPT_BATCH = f"""You are an email categorization assistant. Categorize EACH of the numbered emails provided by the user into ONE of these categories:
+
+{CATEGORIES_LIST}
+
+Respond with ONLY a JSON object of this exact form, one entry per email:
+{{"results": [{{"idx": 1, "category": "invoice"}}, {{"idx": 2, "category": "other"}}]}}"""
+
+# Static user-message prefixes; only the email content is built per call
+USER_PREFIX_SINGLE = "Email to categorize:\n"
+USER_PREFIX_BATCH = "Emails to categorize:\n"
+
 def load_emails_cache(cache_path='.tmp/emails_cache.json'):
     """
 
@@ -38,17 +119,21 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 Load cached emails."""
+    if not os.path.exists(cache_path) and os.path.exists(cache_path + '.gz'):
+        cache_path += '.gz'
+
     if not os.path.exists(cache_path):
         raise FileNotFoundError(f"Email cache not found at {cache_path}")
 
-    with open(cache_path, 'r', encoding='utf-8') as f:
+    opener = gzip.open if cache_path.endswith('.gz') else open
+    with opener(cache_path, 'rt', encoding='utf-8') as f:
         data = json.load(f)
 
     return data['emails']
 
-def categorize_with_anthropic(email_data, api_key):
+async def categorize_with_anthropic(email_data, api_key):
     """Categorize email using Anthropic Claude."""
-    client = Anthropic(api_key=api_key)
+    client = get_anthropic_client(api_key)
 
     # Build email context
     email_text = f"""
@@ -63,22 +148,16 @@ Body (first 1000 chars):
 Attachments: {', '.join([att['filename'] for att in email_data['attachments']])}
 """
 
-    categories_list = '\n'.join([f"- {k}: {v}" for k, v in CATEGORIES.items()])
-
-    prompt = f"""You are an email categorization assistant. Categorize the following email into ONE of these categories:
-
-{categories_list}
-
-Email to categorize:
-{email_text}
-
-Respond with ONLY the category name (e.g., "invoice" or "new_client_inquiry"). No explanations."""
-
     try:
-        message = client.messages.create(
+        message = await client.messages.create(
             model="claude-3-5-sonnet-20241022",
             max_tokens=50,
-            messages=[{"role": "user", "content": prompt}]
+            system=[{
+                "type": "text",
+                "text": SYSTEM_PROMPT_SINGLE,
+                "cache_control": {"type": "ephemeral"}
+            }],
+            messages=[{"role": "user", "content": USER_PREFIX_SINGLE + email_text}]
         )
 
         category = message.content[0].text.strip().lower()
@@ -94,9 +173,9 @@ Respond with ONLY the category name (e.g., "invoice" or "new_client_inquiry"). N
         print(f"Anthropic API error: {e}")
         return None
 
-def categorize_with_openai(email_data, api_key):
+async def categorize_with_openai(email_data, api_key):
     """Categorize email using OpenAI (fallback)."""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     # Build email context
     email_text = f"""
@@ -111,21 +190,13 @@ Body (first 1000 chars):
 Attachments: {', '.join([att['filename'] for att in email_data['attachments']])}
 """
 
-    categories_list = '\n'.join([f"- {k}: {v}" for k, v in CATEGORIES.items()])
-
-    prompt = f"""You are an email categorization assistant. Categorize the following email into ONE of these categories:
-
-{categories_list}
-
-Email to categorize:
-{email_text}
-
-Respond with ONLY the category name (e.g., "invoice" or "new_client_inquiry"). No explanations."""
-
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT_SINGLE},
+                {"role": "user", "content": USER_PREFIX_SINGLE + email_text}
+            ],
             max_tokens=50,
             temperature=0
         )
@@ -143,10 +214,213 @@ Respond with ONLY the category name (e.g., "invoice" or "new_client_inquiry"). N
         print(f"OpenAI API error: {e}")
         return None
 
-def categorize_emails(emails, use_anthropic=False):
+# Singleton API clients. Constructing a client per call pays TLS/TCP
+# setup every time; one pooled HTTP/2 connection multiplexes all the
+# concurrent LLM requests instead.
+_anthropic_client = None
+_openai_client = None
+
+def _http_client():
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100)
+    )
+
+def get_anthropic_client(api_key):
+    global _anthropic_client
+    if _anthropic_client is None:
+        _anthropic_client = AsyncAnthropic(api_key=api_key, http_client=_http_client())
+    return _anthropic_client
+
+def get_openai_client(api_key):
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(api_key=api_key, http_client=_http_client())
+    return _openai_client
+
+def precategorize(email):
+    """Rule-based fast path for trivially classifiable emails.
+
+    Returns a category, or None when the email is ambiguous and needs
+    the LLM.
+    """
+    subject = email['subject'].lower()
+    sender = email['from'].lower()
+    haystack = f"{subject} {email['snippet'].lower()}"
+
+    # Invoices first: billing senders often also use noreply-style addresses
+    if any(h in sender for h in INVOICE_SENDER_HINTS):
+        return 'invoice'
+    if any(h in subject for h in INVOICE_SUBJECT_HINTS):
+        return 'invoice'
+
+    if any(h in sender for h in ADVERTISING_SENDER_HINTS):
+        return 'advertising'
+    if any(h in haystack for h in ADVERTISING_HINTS):
+        return 'advertising'
+
+    return None
+
+# The classifier outputs one logit per category, in this fixed order
+LOCAL_CLASSIFIER_CATEGORIES = list(CATEGORIES)
+
+def load_local_classifier():
+    """Load the local ONNX classifier, or None when unavailable.
+
+    Missing onnxruntime/numpy or a missing model file both just disable
+    the local fast path; every email then goes to the LLM as before.
+    """
+    if onnxruntime is None or np is None:
+        return None
+    if not os.path.exists(LOCAL_CLASSIFIER_PATH):
+        return None
+
+    try:
+        return onnxruntime.InferenceSession(
+            LOCAL_CLASSIFIER_PATH,
+            providers=['CPUExecutionProvider']
+        )
+    except Exception as e:
+        print(f"Warning: Could not load local classifier: {e}")
+        return None
+
+def featurize_email(email):
+    """Hashed bag-of-words vector over subject + snippet.
+
+    Must match the featurization used when training the classifier.
+    """
+    vec = np.zeros((1, LOCAL_FEATURE_DIM), dtype=np.float32)
+
+    for token in f"{email['subject']} {email['snippet']}".lower().split():
+        bucket = int(hashlib.blake2b(token.encode(), digest_size=4).hexdigest(), 16)
+        vec[0, bucket % LOCAL_FEATURE_DIM] += 1.0
+
+    return vec
+
+def classify_local(session, email):
+    """Classify an email with the local model.
+
+    Returns a category when the model is confident enough, or None to
+    escalate to the LLM path.
+    """
+    try:
+        logits = session.run(None, {
+            session.get_inputs()[0].name: featurize_email(email)
+        })[0][0]
+    except Exception as e:
+        print(f"Warning: Local classifier error: {e}")
+        return None
+
+    exp = np.exp(logits - logits.max())
+    probs = exp / exp.sum()
+
+    if probs.max() < LOCAL_CLASSIFIER_THRESHOLD:
+        return None
+
+    return LOCAL_CLASSIFIER_CATEGORIES[int(probs.argmax())]
+
+def open_category_cache():
+    """Open the persistent categorization cache (None if diskcache missing)."""
+    if diskcache is None:
+        return None
+    return diskcache.Cache(CACHE_DIR)
+
+def category_cache_key(email_id, model):
+    """Stable cache key for one email's categorization."""
+    return hashlib.blake2b(
+        f"{email_id}|{model}|{PROMPT_VERSION}".encode()
+    ).hexdigest()
+
+def build_batch_prompt(email_chunk):
+    """Build the per-chunk user message listing the numbered emails."""
+    email_blocks = []
+    for idx, email in enumerate(email_chunk, 1):
+        email_blocks.append(
+            f"[{idx}] Subject: {email['subject']}\n"
+            f"    From: {email['from']}\n"
+            f"    Snippet: {email['snippet']}"
+        )
+
+    return USER_PREFIX_BATCH + '\n'.join(email_blocks)
+
+def parse_batch_response(text, chunk_size):
+    """Parse the JSON batch response into an idx -> category dict."""
+    # Strip markdown fences if the model added them
+    if '```' in text:
+        text = text.split('```')[1]
+        if text.startswith('json'):
+            text = text[4:]
+
+    data = json.loads(text.strip())
+
+    categories = {}
+    for entry in data.get('results', []):
+        idx = entry.get('idx')
+        category = str(entry.get('category', '')).strip().lower()
+
+        if isinstance(idx, int) and 1 <= idx <= chunk_size:
+            if category not in CATEGORIES:
+                print(f"Warning: Invalid category '{category}', defaulting to 'other'")
+                category = 'other'
+            categories[idx] = category
+
+    return categories
+
+async def categorize_batch_with_anthropic(email_chunk, api_key):
+    """Categorize a chunk of emails in one Anthropic Claude call."""
+    client = get_anthropic_client(api_key)
+
+    try:
+        message = await client.messages.create(
+            model="claude-3-5-sonnet-20241022",
+            max_tokens=30 * len(email_chunk) + 50,
+            system=[{
+                "type": "text",
+                "text": SYSTEM_PROMPT_BATCH,
+                "cache_control": {"type": "ephemeral"}
+            }],
+            messages=[{"role": "user", "content": build_batch_prompt(email_chunk)}]
+        )
+
+        return parse_batch_response(message.content[0].text, len(email_chunk))
+
+    except Exception as e:
+        print(f"Anthropic API error: {e}")
+        return None
+
+async def categorize_batch_with_openai(email_chunk, api_key):
+    """Categorize a chunk of emails in one OpenAI call."""
+    client = get_openai_client(api_key)
+
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT_BATCH},
+                {"role": "user", "content": build_batch_prompt(email_chunk)}
+            ],
+            max_tokens=30 * len(email_chunk) + 50,
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+
+        return parse_batch_response(
+            response.choices[0].message.content, len(email_chunk)
+        )
+
+    except Exception as e:
+        print(f"OpenAI API error: {e}")
+        return None
+
+async def categorize_emails(emails, use_anthropic=False):
     """
     Categorize all emails using LLM.
 
+    Emails are grouped BATCH_SIZE per LLM call so the shared category
+    list is sent once per chunk, and chunks are dispatched concurrently
+    (up to CONCURRENCY in flight) so wall time is bounded by provider
+    rate limits instead of one round-trip per email.
+
     Args:
         emails: List of email objects
         use_anthropic: Use Anthropic Claude (True) or OpenAI (False)
@@ -164,38 +438,134 @@ def categorize_emails(emails, use_anthropic=False):
     if not use_anthropic and not openai_key:
         raise ValueError("No valid API keys found in .env file")
 
-    categorized = []
-    total = len(emails)
+    model = "claude-3-5-sonnet-20241022" if use_anthropic else "gpt-4o-mini"
+    cache = open_category_cache()
 
-    for i, email in enumerate(emails, 1):
-        print(f"Categorizing email {i}/{total}: {email['subject'][:50]}...", end='\r')
+    # Skip emails already categorized on a previous run or matched by the
+    # rule-based pre-filter; only ambiguous emails go to the LLM
+    local_model = load_local_classifier()
+    pending = []
+    cache_hits = 0
+    rule_hits = 0
+    local_hits = 0
 
+    for email in emails:
+        cached = cache.get(category_cache_key(email['id'], model)) if cache is not None else None
+        if cached is not None:
+            email['category'] = cached
+            cache_hits += 1
+            continue
+
+        rule_category = precategorize(email)
+        if rule_category is not None:
+            email['category'] = rule_category
+            rule_hits += 1
+            continue
+
+        if local_model is not None:
+            local_category = classify_local(local_model, email)
+            if local_category is not None:
+                email['category'] = local_category
+                local_hits += 1
+                continue
+
+        pending.append(email)
+
+    if cache_hits:
+        print(f"Reusing {cache_hits} cached categorizations.")
+    if rule_hits:
+        print(f"Pre-filter categorized {rule_hits}/{len(emails)} emails without LLM calls.")
+    if local_hits:
+        print(f"Local classifier categorized {local_hits}/{len(emails)} emails without LLM calls.")
+
+    sem = asyncio.Semaphore(CONCURRENCY)
+    total = len(pending)
+    done = 0
+
+    async def categorize_one(email):
+        """Single-email fallback path."""
         # Try primary LLM
         if use_anthropic:
-            category = categorize_with_anthropic(email, anthropic_key)
+            category = await categorize_with_anthropic(email, anthropic_key)
         else:
-            category = categorize_with_openai(email, openai_key)
+            category = await categorize_with_openai(email, openai_key)
 
         # Fallback to other LLM if primary fails
         if category is None:
             print(f"\nPrimary LLM failed, trying fallback...")
             if use_anthropic and openai_key:
-                category = categorize_with_openai(email, openai_key)
+                category = await categorize_with_openai(email, openai_key)
             elif not use_anthropic and anthropic_key:
-                category = categorize_with_anthropic(email, anthropic_key)
+                category = await categorize_with_anthropic(email, anthropic_key)
 
-        # Last resort: mark as 'other'
-        if category is None:
-            print(f"\nWarning: Could not categorize email {email['id']}, marking as 'other'")
-            category = 'other'
+        return category
+
+    async def categorize_chunk(chunk):
+        nonlocal done
+
+        async with sem:
+            # Try one batched call for the whole chunk
+            if use_anthropic:
+                batch_result = await categorize_batch_with_anthropic(chunk, anthropic_key)
+            else:
+                batch_result = await categorize_batch_with_openai(chunk, openai_key)
+
+            if batch_result is None:
+                batch_result = {}
+
+            # Per-email fallback for anything the batch call missed
+            for idx, email in enumerate(chunk, 1):
+                category = batch_result.get(idx)
+
+                if category is None:
+                    category = await categorize_one(email)
 
-        email['category'] = category
-        categorized.append(email)
+                if category is None:
+                    print(f"\nWarning: Could not categorize email {email['id']}, marking as 'other'")
+                    category = 'other'
+                elif cache is not None:
+                    cache[category_cache_key(email['id'], model)] = category
 
-    print(f"\nSuccessfully categorized {len(categorized)} emails.")
-    return categorized
+                email['category'] = category
+                done += 1
+                print(f"Categorized {done}/{total} emails...", end='\r')
 
-def save_categorization_results(emails, output_path='.tmp/categorization_results.json'):
+    chunks = [pending[i:i + BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
+
+    results = await asyncio.gather(
+        *[categorize_chunk(chunk) for chunk in chunks],
+        return_exceptions=True
+    )
+
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            print(f"\nWarning: Error categorizing chunk: {result}")
+            for email in chunk:
+                email.setdefault('category', 'other')
+
+    if cache is not None:
+        cache.close()
+
+    print(f"\nSuccessfully categorized {len(emails)} emails.")
+    return emails
+
+def write_json_gz(output_path, payload):
+    """Write compact JSON inside a gzip stream (level 3: fast, ~3x smaller)."""
+    if orjson is not None:
+        data = orjson.dumps(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    with gzip.open(output_path, 'wb', compresslevel=3) as f:
+        f.write(data)
+
+    # Drop any pre-migration plain .json sitting beside the .gz;
+    # loaders prefer the plain path, so a stale one would silently
+    # shadow every write made here
+    if output_path.endswith('.gz') and os.path.exists(output_path[:-3]):
+        os.remove(output_path[:-3])
+
+def save_categorization_results(emails, output_path='.tmp/categorization_results.json.gz'):
     """Save categorized emails to file."""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
@@ -205,31 +575,33 @@ def save_categorization_results(emails, output_path='.tmp/categorization_results
         cat = email.get('category', 'other')
         category_counts[cat] = category_counts.get(cat, 0) + 1
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'total_emails': len(emails),
-            'category_counts': category_counts,
-            'emails': emails
-        }, f, indent=2, ensure_ascii=False)
+    write_json_gz(output_path, {
+        'total_emails': len(emails),
+        'category_counts': category_counts,
+        'emails': emails
+    })
 
     print(f"Saved categorization results to {output_path}")
     print("\nCategory breakdown:")
     for cat, count in sorted(category_counts.items()):
         print(f"  {cat}: {count}")
 
+def run(emails=None, use_anthropic=False):
+    """Categorize emails (loading the cache when none are passed) and save results."""
+    if emails is None:
+        emails = load_emails_cache()
+        print(f"Loaded {len(emails)} emails from cache.")
+
+    categorized_emails = asyncio.run(categorize_emails(emails, use_anthropic=use_anthropic))
+    save_categorization_results(categorized_emails)
+    return categorized_emails
+
 if __name__ == '__main__':
     import sys
 
-    # Load cached emails
-    emails = load_emails_cache()
-    print(f"Loaded {len(emails)} emails from cache.")
-
     # Categorize (default to OpenAI)
     use_anthropic = False
     if len(sys.argv) > 1 and sys.argv[1].lower() == 'openai':
         use_anthropic = False
 
-    categorized_emails = categorize_emails(emails, use_anthropic=use_anthropic)
-
-    # Save results
-    save_categorization_results(categorized_emails)
+    run(use_anthropic=use_anthropic)
@@ -7,39 +7,106 @@ import os
 import sys
 import json
 import re
+import io
+import base64
+import hashlib
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Set UTF-8 encoding for Windows
 if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 load_dotenv()
 
+# pypdfium2 (PDFium C++ bindings) parses text 5-10x faster than the
+# pure-Python pdfplumber stack; keep pdfplumber as fallback
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
 try:
     import pdfplumber
 except ImportError:
-    print("Error: pdfplumber not installed. Run: pip install pdfplumber")
+    pdfplumber = None
+
+if pdfium is None and pdfplumber is None:
+    print("Error: no PDF library installed. Run: pip install pypdfium2")
     sys.exit(1)
 
 INVOICE_DIR = os.getenv('INVOICE_DIR', 'invoices')
 
+# Compiled once; used per-invoice in normalize_sender_name
+_NORM_RE = re.compile(r'[^a-z0-9]+')
+
+# Common vendor-name mappings for folder organization
+_SENDER_MAPPINGS = {
+    'anthropic_pbc': 'anthropic',
+    'google_workspace': 'google',
+    'loom_inc': 'loom',
+    'apify_technologies': 'apify'
+}
+
+# Bump when the extraction prompt changes to invalidate cached results
+PROMPT_VERSION = 'v1'
+CACHE_DIR = '.tmp/invoice_cache'
+EXTRACTION_MODEL = 'gpt-4o-mini'
+
+# Concurrent LLM extraction calls running while further PDFs parse
+CONSUMER_COUNT = 8
+
+def open_invoice_cache():
+    """Open the persistent extraction cache (None if diskcache missing)."""
+    if diskcache is None:
+        return None
+    return diskcache.Cache(CACHE_DIR)
+
+def invoice_cache_key(pdf_path):
+    """Cache key derived from PDF content, so renames/moves still hit."""
+    content_hash = hashlib.blake2b(Path(pdf_path).read_bytes()).hexdigest()
+    return f"{content_hash}|{EXTRACTION_MODEL}|{PROMPT_VERSION}"
+
 def extract_text_from_pdf(pdf_path, max_pages=3):
-    """Extract text from PDF using pdfplumber."""
+    """Extract text from PDF (pypdfium2 when available, else pdfplumber)."""
     text_content = []
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Extract from first few pages (invoices usually on first page)
-            pages_to_read = min(len(pdf.pages), max_pages)
+        if pdfium is not None:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                # Extract from first few pages (invoices usually on first page)
+                pages_to_read = min(len(pdf), max_pages)
+
+                for i in range(pages_to_read):
+                    text = pdf[i].get_textpage().get_text_range()
+                    if text:
+                        text_content.append(text)
+            finally:
+                pdf.close()
+        else:
+            with pdfplumber.open(pdf_path) as pdf:
+                pages_to_read = min(len(pdf.pages), max_pages)
 
-            for i in range(pages_to_read):
-                page = pdf.pages[i]
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
+                for i in range(pages_to_read):
+                    page = pdf.pages[i]
+                    text = page.extract_text()
+                    if text:
+                        text_content.append(text)
 
         return "\n\n--- PAGE BREAK ---\n\n".join(text_content)
 
@@ -47,21 +114,14 @@ def extract_text_from_pdf(pdf_path, max_pages=3):
         print(f"  Error extracting text from {pdf_path}: {e}")
         return None
 
-def extract_invoice_data_with_llm(text, filename, api_key):
-    """Use LLM to extract structured invoice data."""
-    client = OpenAI(api_key=api_key)
-
-    # Limit text length for API
-    text_sample = text[:4000] if len(text) > 4000 else text
-
-    prompt = f"""Extract invoice data from this text and respond with ONLY valid JSON in this exact format:
-{{
+EXTRACTION_INSTRUCTIONS = """Extract invoice data and respond with ONLY valid JSON in this exact format:
+{
   "date": "YYYY-MM-DD format or null if not found",
   "sender": "Company/vendor name or null if not found",
   "invoice_number": "Invoice/receipt number or null if not found",
   "amount": numeric value only (e.g., 100.50) or null if not found,
   "currency": "USD/EUR/GBP/etc or null if not found"
-}}
+}
 
 Important:
 - For date: convert any date format to YYYY-MM-DD
@@ -69,38 +129,109 @@ Important:
 - For amount: extract the TOTAL amount or amount paid (numeric only, no symbols)
 - For currency: use 3-letter code (USD, EUR, etc.) from symbols ($=USD, €=EUR) or text
 
+Respond with ONLY the JSON object, no other text."""
+
+def parse_invoice_response(json_text):
+    """Parse the LLM's JSON response and attach a confidence score."""
+    # Try to extract JSON if wrapped in markdown
+    if "```json" in json_text:
+        json_text = json_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in json_text:
+        json_text = json_text.split("```")[1].split("```")[0].strip()
+
+    data = json.loads(json_text)
+
+    # Calculate confidence based on how many fields were extracted
+    fields_found = sum(1 for v in data.values() if v is not None)
+    confidence = fields_found / 5.0  # 5 fields total
+
+    data['confidence'] = round(confidence, 2)
+
+    return data
+
+async def extract_invoice_data_with_llm(text, filename, client):
+    """Use LLM to extract structured invoice data."""
+    # Limit text length for API
+    text_sample = text[:4000] if len(text) > 4000 else text
+
+    prompt = f"""{EXTRACTION_INSTRUCTIONS}
+
 Invoice filename: {filename}
 
 Invoice text:
-{text_sample}
-
-Respond with ONLY the JSON object, no other text."""
+{text_sample}"""
 
+    json_text = ''
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = await client.chat.completions.create(
+            model=EXTRACTION_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=200,
             temperature=0
         )
 
         json_text = response.choices[0].message.content.strip()
+        return parse_invoice_response(json_text)
+
+    except json.JSONDecodeError as e:
+        print(f"  JSON parse error: {e}")
+        print(f"  LLM response: {json_text[:200]}")
+        return None
+    except Exception as e:
+        print(f"  LLM API error: {e}")
+        return None
+
+def render_pdf_page_base64(pdf_path, scale=2):
+    """Rasterize the first PDF page to a base64 PNG for vision extraction."""
+    if pdfium is None:
+        return None
+
+    try:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            image = pdf[0].render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+
+        buf = io.BytesIO()
+        image.save(buf, 'PNG')
+        return base64.b64encode(buf.getvalue()).decode('ascii')
 
-        # Try to extract JSON if wrapped in markdown
-        if "```json" in json_text:
-            json_text = json_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in json_text:
-            json_text = json_text.split("```")[1].split("```")[0].strip()
+    except Exception as e:
+        print(f"  Error rendering {pdf_path}: {e}")
+        return None
+
+async def extract_invoice_data_from_image(image_b64, filename, client):
+    """Extract invoice data from a rasterized page via a vision model.
+
+    Fast path for scanned/image-only PDFs that would otherwise fail with
+    'needs OCR'.
+    """
+    prompt = f"""{EXTRACTION_INSTRUCTIONS}
 
-        data = json.loads(json_text)
+Invoice filename: {filename}
 
-        # Calculate confidence based on how many fields were extracted
-        fields_found = sum(1 for v in data.values() if v is not None)
-        confidence = fields_found / 5.0  # 5 fields total
+The invoice is provided as an image."""
 
-        data['confidence'] = round(confidence, 2)
+    json_text = ''
+    try:
+        response = await client.chat.completions.create(
+            model=EXTRACTION_MODEL,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {
+                        "url": f"data:image/png;base64,{image_b64}"
+                    }}
+                ]
+            }],
+            max_tokens=200,
+            temperature=0
+        )
 
-        return data
+        json_text = response.choices[0].message.content.strip()
+        return parse_invoice_response(json_text)
 
     except json.JSONDecodeError as e:
         print(f"  JSON parse error: {e}")
@@ -116,18 +247,9 @@ def normalize_sender_name(sender):
         return "unknown"
 
     # Convert to lowercase, remove special chars
-    normalized = re.sub(r'[^a-z0-9]+', '_', sender.lower())
-    normalized = normalized.strip('_')
+    normalized = _NORM_RE.sub('_', sender.lower()).strip('_')
 
-    # Common mappings
-    mappings = {
-        'anthropic_pbc': 'anthropic',
-        'google_workspace': 'google',
-        'loom_inc': 'loom',
-        'apify_technologies': 'apify'
-    }
-
-    return mappings.get(normalized, normalized)
+    return _SENDER_MAPPINGS.get(normalized, normalized)
 
 def process_invoice_pdfs(invoice_dir=INVOICE_DIR):
     """
@@ -150,78 +272,180 @@ def process_invoice_pdfs(invoice_dir=INVOICE_DIR):
 
     print(f"Found {len(pdf_files)} invoice PDFs to process.\n")
 
+    cache = open_invoice_cache()
+
+    # Resolve cache hits first; only the remaining PDFs go through the
+    # parse + LLM pipeline
+    cache_keys = {}
+    cached_results = {}
+
+    if cache is not None:
+        for pdf_path in pdf_files:
+            cache_keys[pdf_path] = invoice_cache_key(pdf_path)
+            cached = cache.get(cache_keys[pdf_path])
+            if cached is not None:
+                cached_results[pdf_path] = dict(cached)
+
     invoices_data = []
     errors = []
 
-    for i, pdf_path in enumerate(pdf_files, 1):
-        filename = pdf_path.name
-        relative_path = str(pdf_path.relative_to(invoice_dir))
-
-        print(f"Processing {i}/{len(pdf_files)}: {filename}")
-
-        # Extract text from PDF
-        text = extract_text_from_pdf(pdf_path)
-
-        if not text or len(text.strip()) < 50:
-            print(f"  ⚠️  Insufficient text extracted (possibly scanned image)")
-            errors.append({
-                'filename': filename,
-                'path': str(pdf_path),
-                'error': 'Insufficient text extracted - may need OCR'
-            })
-            continue
-
-        # Save extracted text
-        text_dir = Path('.tmp/invoice_texts')
-        text_dir.mkdir(parents=True, exist_ok=True)
-
-        text_file = text_dir / f"{pdf_path.stem}.txt"
-        with open(text_file, 'w', encoding='utf-8') as f:
-            f.write(text)
-
-        # Extract structured data with LLM
-        invoice_data = extract_invoice_data_with_llm(text, filename, api_key)
-
-        if not invoice_data:
-            print(f"  ✗ Failed to extract data")
-            errors.append({
-                'filename': filename,
-                'path': str(pdf_path),
-                'error': 'LLM extraction failed'
-            })
-            continue
-
-        # Add metadata
-        invoice_data['filename'] = filename
-        invoice_data['original_path'] = str(pdf_path)
-        invoice_data['relative_path'] = relative_path
-        invoice_data['processed_at'] = datetime.now().isoformat()
-
-        # Normalize sender
-        if invoice_data.get('sender'):
-            invoice_data['sender_normalized'] = normalize_sender_name(invoice_data['sender'])
-        else:
-            invoice_data['sender_normalized'] = 'unknown'
-
+    for pdf_path, invoice_data in cached_results.items():
+        print(f"✓ Reusing cached extraction: {pdf_path.name}")
+        finalize_invoice_data(invoice_data, pdf_path, invoice_dir)
         invoices_data.append(invoice_data)
 
-        # Print summary
-        conf_icon = "✓" if invoice_data['confidence'] >= 0.8 else "⚠️"
-        print(f"  {conf_icon} Extracted: {invoice_data.get('sender', 'N/A')} | "
-              f"{invoice_data.get('date', 'N/A')} | "
-              f"{invoice_data.get('amount', 'N/A')} {invoice_data.get('currency', 'N/A')} | "
-              f"Confidence: {invoice_data['confidence']}")
+    to_parse = [p for p in pdf_files if p not in cached_results]
+
+    if to_parse:
+        asyncio.run(_extract_invoices_pipelined(
+            to_parse, invoice_dir, api_key, cache, cache_keys,
+            invoices_data, errors
+        ))
+
+    if cache is not None:
+        cache.close()
 
     return invoices_data, errors
 
+def finalize_invoice_data(invoice_data, pdf_path, invoice_dir):
+    """Attach file/path metadata and print the extraction summary."""
+    invoice_data['filename'] = pdf_path.name
+    invoice_data['original_path'] = str(pdf_path)
+    invoice_data['relative_path'] = str(pdf_path.relative_to(invoice_dir))
+    invoice_data['processed_at'] = datetime.now().isoformat()
+
+    # Normalize sender
+    if invoice_data.get('sender'):
+        invoice_data['sender_normalized'] = normalize_sender_name(invoice_data['sender'])
+    else:
+        invoice_data['sender_normalized'] = 'unknown'
+
+    conf_icon = "✓" if invoice_data['confidence'] >= 0.8 else "⚠️"
+    print(f"  {conf_icon} Extracted: {invoice_data.get('sender', 'N/A')} | "
+          f"{invoice_data.get('date', 'N/A')} | "
+          f"{invoice_data.get('amount', 'N/A')} {invoice_data.get('currency', 'N/A')} | "
+          f"Confidence: {invoice_data['confidence']}")
+
+async def _extract_invoices_pipelined(pdf_files, invoice_dir, api_key, cache,
+                                      cache_keys, invoices_data, errors):
+    """Pipeline CPU-bound PDF parsing with network-bound LLM extraction.
+
+    A producer parses PDFs on a process pool and feeds (path, text) pairs
+    into a queue while CONSUMER_COUNT consumers await the LLM calls, so
+    the next PDF is parsing while earlier extraction requests are in
+    flight instead of each stage idling during the other.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=CONSUMER_COUNT * 2)
+    client = AsyncOpenAI(api_key=api_key)
+    total = len(pdf_files)
+    done = 0
+
+    print(f"Parsing {total} PDFs ({os.cpu_count()} workers) with "
+          f"{CONSUMER_COUNT} concurrent extractions...")
+
+    async def producer(pool):
+        # Every parse is submitted up front so the pool stays full;
+        # awaiting one future at a time here would serialize parsing
+        # to a single worker. Results enqueue in submission order and
+        # the queue's maxsize provides the backpressure.
+        parse_futures = [
+            loop.run_in_executor(pool, extract_text_from_pdf, pdf_path)
+            for pdf_path in pdf_files
+        ]
+        for pdf_path, future in zip(pdf_files, parse_futures):
+            await queue.put((pdf_path, await future))
+        for _ in range(CONSUMER_COUNT):
+            await queue.put(None)
+
+    async def consumer():
+        nonlocal done
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+
+            pdf_path, text = item
+            filename = pdf_path.name
+            done += 1
+            print(f"Processing {done}/{total}: {filename}")
+
+            if not text or len(text.strip()) < 50:
+                # Scanned/image-only PDF: rasterize the first page and let
+                # the vision model extract instead of failing with 'needs OCR'
+                print(f"  ⚠️  Insufficient text extracted - trying vision extraction")
+                image_b64 = await loop.run_in_executor(
+                    None, render_pdf_page_base64, pdf_path
+                )
+                invoice_data = None
+
+                if image_b64:
+                    invoice_data = await extract_invoice_data_from_image(
+                        image_b64, filename, client
+                    )
+
+                if not invoice_data:
+                    print(f"  ✗ Vision extraction failed")
+                    errors.append({
+                        'filename': filename,
+                        'path': str(pdf_path),
+                        'error': 'Insufficient text extracted - may need OCR'
+                    })
+                    continue
+            else:
+                # Save extracted text
+                text_dir = Path('.tmp/invoice_texts')
+                text_dir.mkdir(parents=True, exist_ok=True)
+
+                text_file = text_dir / f"{pdf_path.stem}.txt"
+                with open(text_file, 'w', encoding='utf-8') as f:
+                    f.write(text)
+
+                # Extract structured data with LLM
+                invoice_data = await extract_invoice_data_with_llm(
+                    text, filename, client
+                )
+
+                if not invoice_data:
+                    print(f"  ✗ Failed to extract data")
+                    errors.append({
+                        'filename': filename,
+                        'path': str(pdf_path),
+                        'error': 'LLM extraction failed'
+                    })
+                    continue
+
+            if cache is not None:
+                cache[cache_keys[pdf_path]] = dict(invoice_data)
+
+            finalize_invoice_data(invoice_data, pdf_path, invoice_dir)
+            invoices_data.append(invoice_data)
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        await asyncio.gather(
+            producer(pool),
+            *(consumer() for _ in range(CONSUMER_COUNT))
+        )
+
+def write_json(output_path, payload):
+    """Write JSON with orjson (C serializer) when available."""
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(
+                payload,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+            ))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+
 def save_invoice_metadata(invoices_data, output_path='invoices_metadata.json'):
     """Save extracted invoice data to JSON file."""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'generated_at': datetime.now().isoformat(),
-            'total_invoices': len(invoices_data),
-            'invoices': invoices_data
-        }, f, indent=2, ensure_ascii=False)
+    write_json(output_path, {
+        'generated_at': datetime.now().isoformat(),
+        'total_invoices': len(invoices_data),
+        'invoices': invoices_data
+    })
 
     print(f"\n✓ Saved metadata for {len(invoices_data)} invoices to {output_path}")
 
@@ -229,12 +453,11 @@ def save_error_log(errors, output_path='.tmp/invoice_errors.json'):
     """Save processing errors to log file."""
     os.makedirs('.tmp', exist_ok=True)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'generated_at': datetime.now().isoformat(),
-            'total_errors': len(errors),
-            'errors': errors
-        }, f, indent=2, ensure_ascii=False)
+    write_json(output_path, {
+        'generated_at': datetime.now().isoformat(),
+        'total_errors': len(errors),
+        'errors': errors
+    })
 
     if errors:
         print(f"⚠️  {len(errors)} errors logged to {output_path}")
@@ -248,22 +471,22 @@ def generate_review_queue(invoices_data, threshold=0.7):
 
     if review_queue:
         output_path = '.tmp/invoice_review_queue.json'
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                'generated_at': datetime.now().isoformat(),
-                'total_for_review': len(review_queue),
-                'message': 'These invoices have low confidence and should be manually reviewed',
-                'invoices': review_queue
-            }, f, indent=2, ensure_ascii=False)
+        write_json(output_path, {
+            'generated_at': datetime.now().isoformat(),
+            'total_for_review': len(review_queue),
+            'message': 'These invoices have low confidence and should be manually reviewed',
+            'invoices': review_queue
+        })
 
         print(f"📋 {len(review_queue)} invoices flagged for review → {output_path}")
 
-if __name__ == '__main__':
-    import sys
-
-    # Optional: specify invoice directory
-    invoice_dir = sys.argv[1] if len(sys.argv) > 1 else INVOICE_DIR
+def run(invoice_dir=INVOICE_DIR):
+    """Extract invoice data and persist metadata/error/review files.
 
+    Returns the extracted invoice list so in-process callers can hand
+    it straight to the organization stage without re-reading
+    invoices_metadata.json.
+    """
     print("="*60)
     print("INVOICE DATA EXTRACTION")
     print("="*60)
@@ -291,3 +514,10 @@ if __name__ == '__main__':
     print(f"Needs review (<0.7): {needs_review}")
 
     print("="*60)
+    return invoices_data
+
+if __name__ == '__main__':
+    import sys
+
+    # Optional: specify invoice directory
+    run(sys.argv[1] if len(sys.argv) > 1 else INVOICE_DIR)
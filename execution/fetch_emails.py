@@ -8,9 +8,16 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 import os
+import gzip
 import json
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -20,6 +27,28 @@ from googleapiclient.errors import HttpError
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
+# Gmail allows up to 100 sub-requests per batch HTTP call
+BATCH_SIZE = 100
+
+# Headers needed when fetching in lightweight metadata format
+METADATA_HEADERS = ['Subject', 'From', 'To', 'Date']
+
+# Obvious bulk-mail markers; these emails are categorized from their
+# subject/snippet alone, so the full MIME body is never fetched for them
+BULK_MAIL_HINTS = (
+    'unsubscribe', 'newsletter', 'no-reply', 'noreply',
+    'donotreply', 'marketing', 'promo'
+)
+
+# Invoice markers override the bulk-mail skip: invoice senders are
+# routinely no-reply addresses, and their bodies/attachments are
+# exactly what process_invoices downloads. Mirrors the heuristics in
+# process_invoices/categorize_emails.
+INVOICE_HINTS = (
+    'invoice', 'receipt', 'bill', 'payment', 'statement',
+    'billing@', 'invoices@', 'accounting@', 'payments@', 'finance@'
+)
+
 def authenticate_gmail():
     """Authenticate with Gmail API using OAuth 2.0."""
     creds = None
@@ -68,43 +97,141 @@ def build_date_query(start_date, end_date, include_status='all'):
 
     return ' '.join(query_parts)
 
-def get_email_body(payload):
-    """Extract email body from message payload."""
-    body = ""
-
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain':
-                if 'data' in part['body']:
-                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                    break
-            elif part['mimeType'] == 'text/html' and not body:
-                if 'data' in part['body']:
-                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-    else:
-        if 'body' in payload and 'data' in payload['body']:
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+def walk_parts(part):
+    """Yield a MIME part and, recursively, all of its nested parts."""
+    yield part
+    for child in part.get('parts', ()):
+        yield from walk_parts(child)
 
-    return body
+def extract_body_and_attachments(payload):
+    """Walk the MIME tree once, collecting body and attachments together.
 
-def get_attachments_info(payload):
-    """Extract attachment information from message payload."""
+    Handles nested multipart structures (e.g. multipart/alternative
+    inside multipart/mixed, common in real Gmail) that a flat scan of
+    payload['parts'] misses, and avoids traversing the tree twice for
+    body and attachments separately. The body is base64-decoded exactly
+    once, preferring text/plain over text/html.
+    """
+    plain = None
+    html = None
     attachments = []
 
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part.get('filename'):
-                attachment = {
-                    'filename': part['filename'],
-                    'mimeType': part['mimeType'],
-                    'attachmentId': part['body'].get('attachmentId'),
-                    'size': part['body'].get('size', 0)
-                }
-                attachments.append(attachment)
+    for part in walk_parts(payload):
+        body = part.get('body', {})
+
+        if part.get('filename'):
+            attachments.append({
+                'filename': part['filename'],
+                'mimeType': part['mimeType'],
+                'attachmentId': body.get('attachmentId'),
+                'size': body.get('size', 0)
+            })
+            continue
+
+        data = body.get('data')
+        if not data:
+            continue
+
+        if part['mimeType'] == 'text/plain' and plain is None:
+            plain = data
+        elif part['mimeType'] == 'text/html' and html is None:
+            html = data
+
+    chosen = plain or html
+    if chosen is None:
+        return "", attachments
+
+    return base64.urlsafe_b64decode(chosen).decode('utf-8', 'replace'), attachments
+
+def parse_message(message):
+    """Build email object from a full Gmail message resource."""
+    headers = {h['name']: h['value'] for h in message['payload']['headers']}
+    body, attachments = extract_body_and_attachments(message['payload'])
+
+    return {
+        'id': message['id'],
+        'threadId': message['threadId'],
+        'labelIds': message.get('labelIds', []),
+        'snippet': message.get('snippet', ''),
+        'subject': headers.get('Subject', '(No Subject)'),
+        'from': headers.get('From', ''),
+        'to': headers.get('To', ''),
+        'date': headers.get('Date', ''),
+        'body': body,
+        'attachments': attachments
+    }
+
+def needs_full_fetch(email):
+    """Decide whether an email's full MIME body is worth fetching.
+
+    Invoices and client emails need bodies/attachments downstream;
+    obvious bulk mail does not. Anything that looks like an invoice
+    wins over the bulk-mail markers - a Stripe receipt comes from a
+    noreply@ address but its PDF is the whole point of the pipeline.
+    """
+    haystack = f"{email['subject']} {email['from']} {email['snippet']}".lower()
+
+    if any(hint in haystack for hint in INVOICE_HINTS):
+        return True
+
+    return not any(hint in haystack for hint in BULK_MAIL_HINTS)
+
+def fetch_message_details(service, messages, fmt='full'):
+    """
+    Fetch details for a list of message IDs using batched requests.
+
+    Groups messages().get calls into batches of up to 100 sub-requests,
+    reducing N HTTPS round-trips to ceil(N/100). Messages that fail inside
+    a batch are retried individually.
+
+    Args:
+        service: Gmail API service
+        messages: List of message refs ({'id': ...}) from messages().list
+        fmt: 'full' for the complete MIME tree, 'metadata' for headers
+             and snippet only (~10-100x smaller payloads)
+
+    Returns:
+        List of parsed email objects
+    """
+    emails = []
+    failed_ids = []
+
+    get_kwargs = {'userId': 'me', 'format': fmt}
+    if fmt == 'metadata':
+        get_kwargs['metadataHeaders'] = METADATA_HEADERS
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            failed_ids.append(request_id)
+        else:
+            emails.append(parse_message(response))
+
+    for start in range(0, len(messages), BATCH_SIZE):
+        chunk = messages[start:start + BATCH_SIZE]
+        batch = service.new_batch_http_request(callback=callback)
+
+        for msg in chunk:
+            batch.add(
+                service.users().messages().get(id=msg['id'], **get_kwargs),
+                request_id=msg['id']
+            )
+
+        batch.execute()
+        print(f"Fetched {len(emails)}/{len(messages)} messages ({fmt})...", end='\r')
+
+    # Retry failures one at a time (e.g., transient per-request 4xx)
+    for msg_id in failed_ids:
+        try:
+            message = service.users().messages().get(
+                id=msg_id, **get_kwargs
+            ).execute()
+            emails.append(parse_message(message))
+        except HttpError as error:
+            print(f"\nError fetching message {msg_id}: {error}")
 
-    return attachments
+    return emails
 
-def fetch_emails(start_date, end_date, include_status='all', max_results=500):
+def fetch_emails(start_date, end_date, include_status='all', max_results=None):
     """
     Fetch emails from Gmail within date range.
 
@@ -112,7 +239,8 @@ def fetch_emails(start_date, end_date, include_status='all', max_results=500):
         start_date: Start date (YYYY-MM-DD)
         end_date: End date (YYYY-MM-DD)
         include_status: 'all', 'read', or 'unread'
-        max_results: Maximum number of emails to fetch
+        max_results: Maximum number of emails to fetch, or None to page
+                     through every match
 
     Returns:
         List of email objects with metadata
@@ -127,51 +255,64 @@ def fetch_emails(start_date, end_date, include_status='all', max_results=500):
         query = build_date_query(start_date, end_date, include_status)
         print(f"Search query: {query}")
 
-        # Get list of message IDs
+        def list_page(page_token):
+            return service.users().messages().list(
+                userId='me',
+                q=query,
+                maxResults=min(max_results, 500) if max_results else 500,
+                pageToken=page_token
+            ).execute()
+
+        # Page through message IDs (list() caps at 500 per call, so larger
+        # ranges silently truncate without pagination). The next page's
+        # list() call is prefetched on a worker thread while the current
+        # page's batched metadata gets are in flight.
         print(f"Fetching message IDs...")
-        results = service.users().messages().list(
-            userId='me',
-            q=query,
-            maxResults=max_results
-        ).execute()
+        all_refs = []
+        emails = []
 
-        messages = results.get('messages', [])
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            next_page = prefetcher.submit(list_page, None)
 
-        if not messages:
-            print("No messages found.")
-            return []
+            while next_page is not None:
+                results = next_page.result()
+                refs = results.get('messages', [])
+                token = results.get('nextPageToken')
 
-        print(f"Found {len(messages)} messages. Fetching details...")
+                # Kick off the next list() before processing this page so
+                # its latency hides behind the detail fetches below
+                if token and (max_results is None
+                              or len(all_refs) + len(refs) < max_results):
+                    next_page = prefetcher.submit(list_page, token)
+                else:
+                    next_page = None
 
-        # Fetch full message details
-        emails = []
-        for i, msg in enumerate(messages, 1):
-            print(f"Fetching message {i}/{len(messages)}...", end='\r')
+                if max_results is not None:
+                    refs = refs[:max_results - len(all_refs)]
+                all_refs.extend(refs)
 
-            message = service.users().messages().get(
-                userId='me',
-                id=msg['id'],
-                format='full'
-            ).execute()
+                if refs:
+                    # Phase 1: lightweight metadata (headers + snippet)
+                    print(f"\nFound {len(all_refs)} messages so far. Fetching details...")
+                    emails.extend(fetch_message_details(service, refs, fmt='metadata'))
+
+        if not emails:
+            print("No messages found.")
+            return []
 
-            # Extract headers
-            headers = {h['name']: h['value'] for h in message['payload']['headers']}
-
-            # Build email object
-            email_obj = {
-                'id': message['id'],
-                'threadId': message['threadId'],
-                'labelIds': message.get('labelIds', []),
-                'snippet': message.get('snippet', ''),
-                'subject': headers.get('Subject', '(No Subject)'),
-                'from': headers.get('From', ''),
-                'to': headers.get('To', ''),
-                'date': headers.get('Date', ''),
-                'body': get_email_body(message['payload']),
-                'attachments': get_attachments_info(message['payload'])
-            }
-
-            emails.append(email_obj)
+        # Phase 2: upgrade to full fetch only where the body/attachments
+        # are actually needed downstream
+        need_full = [e for e in emails if needs_full_fetch(e)]
+
+        if need_full:
+            print(f"\nFetching full bodies for {len(need_full)}/{len(emails)} emails...")
+            full_emails = fetch_message_details(
+                service,
+                [{'id': e['id']} for e in need_full],
+                fmt='full'
+            )
+            by_id = {e['id']: e for e in full_emails}
+            emails = [by_id.get(e['id'], e) for e in emails]
 
         print(f"\nSuccessfully fetched {len(emails)} emails.")
         return emails
@@ -180,30 +321,59 @@ def fetch_emails(start_date, end_date, include_status='all', max_results=500):
         print(f"An error occurred: {error}")
         return []
 
-def save_emails_cache(emails, output_path='.tmp/emails_cache.json'):
+def write_json_gz(output_path, payload):
+    """Write compact JSON inside a gzip stream.
+
+    Level-3 gzip is near-lz4 speed and shrinks pretty-printed JSON with
+    base64 bodies several-fold, which also cuts reparse time downstream.
+    """
+    if orjson is not None:
+        data = orjson.dumps(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    with gzip.open(output_path, 'wb', compresslevel=3) as f:
+        f.write(data)
+
+    # Drop any pre-migration plain .json sitting beside the .gz;
+    # loaders prefer the plain path, so a stale one would silently
+    # shadow every write made here
+    if output_path.endswith('.gz') and os.path.exists(output_path[:-3]):
+        os.remove(output_path[:-3])
+
+def save_emails_cache(emails, output_path='.tmp/emails_cache.json.gz'):
     """Save fetched emails to cache file."""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'fetched_at': datetime.now().isoformat(),
-            'count': len(emails),
-            'emails': emails
-        }, f, indent=2, ensure_ascii=False)
+    write_json_gz(output_path, {
+        'fetched_at': datetime.now().isoformat(),
+        'count': len(emails),
+        'emails': emails
+    })
 
     print(f"Saved {len(emails)} emails to {output_path}")
 
+def run(start_date, end_date, status='all', max_results=None):
+    """Fetch emails and persist the cache.
+
+    Returns the email list so in-process callers can pass it straight to
+    the next stage instead of re-reading the cache file.
+    """
+    emails = fetch_emails(start_date, end_date, status, max_results)
+    save_emails_cache(emails)
+    return emails
+
 if __name__ == '__main__':
     import sys
 
     if len(sys.argv) < 3:
-        print("Usage: python fetch_emails.py START_DATE END_DATE [STATUS]")
-        print("Example: python fetch_emails.py 2024-01-01 2024-01-31 all")
+        print("Usage: python fetch_emails.py START_DATE END_DATE [STATUS] [MAX_RESULTS]")
+        print("Example: python fetch_emails.py 2024-01-01 2024-01-31 all 2000")
         sys.exit(1)
 
-    start = sys.argv[1]
-    end = sys.argv[2]
-    status = sys.argv[3] if len(sys.argv) > 3 else 'all'
-
-    emails = fetch_emails(start, end, status)
-    save_emails_cache(emails)
+    run(
+        sys.argv[1],
+        sys.argv[2],
+        sys.argv[3] if len(sys.argv) > 3 else 'all',
+        int(sys.argv[4]) if len(sys.argv) > 4 else None
+    )
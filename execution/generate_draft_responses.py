@@ -8,88 +8,237 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 import os
-import json
 import re
+import gzip
+import json
+import functools
+import time
+import asyncio
+from collections import Counter, deque
 from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
+from email.utils import parseaddr
+
+# Load environment variables (skip the dotenv import when already set;
+# the SDK import itself is deferred to first client use - see
+# get_openai_client - so standalone startup stays fast)
+if not os.getenv('OPENAI_API_KEY'):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def write_json(output_path, payload):
+    """Write JSON with orjson (C serializer) when available."""
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(
+                payload,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+            ))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+
+def load_json(path, opener=open):
+    """Read JSON with orjson (C parser) when available."""
+    if orjson is not None:
+        with opener(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+# Max in-flight draft generations
+CONCURRENCY = 10
+
+# Per-request cap so one hung call can't stall the whole batch
+REQUEST_TIMEOUT = 60
+
+# Request starts allowed per minute (stays under the OpenAI RPM ceiling)
+REQUESTS_PER_MINUTE = 500
+
+# Seconds between Batch API status polls (batches can take up to 24h)
+BATCH_POLL_INTERVAL = 60
+
+# Categories that warrant a drafted reply
+CATEGORIES_NEEDING_DRAFT = frozenset({'new_client_inquiry', 'existing_client'})
+
+# Longest body excerpt included in a prompt
+MAX_PROMPT_BODY = 2000
+
+# Static instruction blocks sent as the system message. Keeping them
+# byte-identical across calls lets OpenAI's automatic prefix caching
+# reuse the prompt prefix instead of re-billing it every call.
+SYSTEM_PROMPT_NEW_CLIENT = """You are a professional business assistant drafting a response to a new client inquiry.
+
+Write a professional, warm, and helpful response that:
+1. Thanks them for reaching out
+2. Acknowledges their specific inquiry or question
+3. Asks 1-2 clarifying questions to better understand their needs
+4. Suggests next steps (e.g., scheduling a call, providing more information)
+5. Keeps it concise (2-3 paragraphs max)
+
+Draft the email response (do not include subject line or greeting with their name - just the body)."""
+
+SYSTEM_PROMPT_EXISTING_CLIENT = """You are a professional business assistant drafting a response to an existing client.
+
+Write a professional response that:
+1. References relevant project context
+2. Addresses their specific message or question
+3. Provides clear next steps or updates
+4. Mentions any pending action items if relevant
+5. Keeps it concise and focused
+
+Draft the email response (do not include subject line or greeting - just the body)."""
+
+@functools.lru_cache(maxsize=1)
+def get_openai_client(api_key):
+    """Cached client: one httpx pool/TLS context reused for every call."""
+    # Deferred: importing the SDK pulls in httpx/pydantic (~0.5s)
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key)
+
+class RateLimiter:
+    """Token bucket limiting how many requests start per minute.
+
+    Tokens refill continuously; acquire() sleeps just long enough for the
+    next token instead of polling.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.capacity / 60.0
+            )
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
 
-# Load environment variables
-load_dotenv()
+            await asyncio.sleep((1 - self.tokens) * 60.0 / self.capacity)
 
 def load_categorized_emails(cache_path='.tmp/categorization_results.json'):
     """Load categorized emails."""
+    if not os.path.exists(cache_path) and os.path.exists(cache_path + '.gz'):
+        cache_path += '.gz'
+
     if not os.path.exists(cache_path):
         raise FileNotFoundError(f"Categorization results not found at {cache_path}")
 
-    with open(cache_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    opener = gzip.open if cache_path.endswith('.gz') else open
+    return load_json(cache_path, opener)['emails']
 
-    return data['emails']
+# Compiled once; only consulted when parseaddr rejects a malformed header
+_EMAIL_RE = re.compile(r'<([^>]+)>')
 
 def extract_sender_email(from_field):
     """Extract email address from 'From' field."""
-    # Extract email from formats like: "John Doe <john@example.com>" or "john@example.com"
-    match = re.search(r'<(.+?)>', from_field)
-    if match:
-        return match.group(1).strip().lower()
-    return from_field.strip().lower()
+    # parseaddr handles quoted display names, comments and bare addresses
+    address = parseaddr(from_field)[1].strip().lower()
+    if address:
+        return address
+
+    # Last resort for headers parseaddr gives up on entirely
+    match = _EMAIL_RE.search(from_field)
+    return match.group(1).strip().lower() if match else ''
 
 def load_client_context(sender_email):
-    """Load existing client context if available."""
+    """Load existing client context if available.
+
+    Understands both the split layout (context_meta.json + append-only
+    communications.jsonl, reading just the recent tail) and the legacy
+    single context.json.
+    """
     context_dir = f"client_contexts/{sender_email}"
-    context_file = os.path.join(context_dir, 'context.json')
+    meta_file = os.path.join(context_dir, 'context_meta.json')
+    comms_file = os.path.join(context_dir, 'communications.jsonl')
+    legacy_file = os.path.join(context_dir, 'context.json')
+
+    if os.path.exists(meta_file):
+        context = load_json(meta_file)
+
+        comms = []
+        if os.path.exists(comms_file):
+            with open(comms_file, 'rb') as f:
+                tail = deque(f, maxlen=3)
+            loads = orjson.loads if orjson is not None else json.loads
+            comms = [loads(line) for line in tail]
+
+        context['communications'] = comms
+        return context
 
-    if os.path.exists(context_file):
-        with open(context_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    if os.path.exists(legacy_file):
+        return load_json(legacy_file)
 
     return None
 
-def generate_new_client_response(email, openai_key):
-    """Generate response for new client inquiry."""
-    client = OpenAI(api_key=openai_key)
+def trim_bodies(emails):
+    """Truncate bodies to MAX_PROMPT_BODY once, ahead of prompt building.
+
+    A 100KB HTML-rich body would otherwise be re-sliced in every prompt
+    builder. Only emails that need trimming are copied, so the caller's
+    (possibly shared) dicts stay intact.
+    """
+    return [
+        {**e, 'body': e['body'][:MAX_PROMPT_BODY]}
+        if len(e.get('body', '')) > MAX_PROMPT_BODY else e
+        for e in emails
+    ]
 
+def build_new_client_messages(email):
+    """Build the chat messages for a new client inquiry draft."""
     email_context = f"""
 Subject: {email['subject']}
 From: {email['from']}
 Date: {email['date']}
 
 Email body:
-{email['body'][:2000]}
+{email['body']}
 """
 
-    prompt = f"""You are a professional business assistant drafting a response to a new client inquiry.
-
-The client sent this email:
-{email_context}
+    prompt = f"""The client sent this email:
+{email_context}"""
 
-Write a professional, warm, and helpful response that:
-1. Thanks them for reaching out
-2. Acknowledges their specific inquiry or question
-3. Asks 1-2 clarifying questions to better understand their needs
-4. Suggests next steps (e.g., scheduling a call, providing more information)
-5. Keeps it concise (2-3 paragraphs max)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT_NEW_CLIENT},
+        {"role": "user", "content": prompt}
+    ]
 
-Draft the email response (do not include subject line or greeting with their name - just the body):"""
+async def generate_new_client_response(email, openai_key):
+    """Generate response for new client inquiry."""
+    client = get_openai_client(openai_key)
 
     try:
-        response = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model="gpt-4o-mini",
             max_tokens=500,
-            messages=[{"role": "user", "content": prompt}]
+            messages=build_new_client_messages(email),
+            stream=True
         )
 
-        return response.choices[0].message.content.strip()
+        parts = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+
+        return ''.join(parts).strip()
 
     except Exception as e:
         print(f"  Error generating response: {e}")
         return None
 
-def generate_existing_client_response(email, context, openai_key):
-    """Generate response for existing client communication."""
-    client = OpenAI(api_key=openai_key)
-
+def build_existing_client_messages(email, context):
+    """Build the chat messages for an existing client draft."""
     # Build context summary
     context_summary = f"""
 Client: {context.get('client_name', 'Unknown')}
@@ -114,48 +263,63 @@ From: {email['from']}
 Date: {email['date']}
 
 Email body:
-{email['body'][:2000]}
+{email['body']}
 """
 
-    prompt = f"""You are a professional business assistant drafting a response to an existing client.
-
-Client context:
+    prompt = f"""Client context:
 {context_summary}
 
 They sent this email:
-{email_context}
+{email_context}"""
 
-Write a professional response that:
-1. References relevant project context
-2. Addresses their specific message or question
-3. Provides clear next steps or updates
-4. Mentions any pending action items if relevant
-5. Keeps it concise and focused
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT_EXISTING_CLIENT},
+        {"role": "user", "content": prompt}
+    ]
 
-Draft the email response (do not include subject line or greeting - just the body):"""
+async def generate_existing_client_response(email, context, openai_key):
+    """Generate response for existing client communication."""
+    client = get_openai_client(openai_key)
 
     try:
-        response = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model="gpt-4o-mini",
             max_tokens=600,
-            messages=[{"role": "user", "content": prompt}]
+            messages=build_existing_client_messages(email, context),
+            stream=True
         )
 
-        return response.choices[0].message.content.strip()
+        parts = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+
+        return ''.join(parts).strip()
 
     except Exception as e:
         print(f"  Error generating response: {e}")
         return None
 
-def generate_draft_responses(emails):
+def save_draft(draft):
+    """Write one draft to its own file under .tmp/drafts/."""
+    write_json(f".tmp/drafts/{draft['email_id']}.json", draft)
+
+async def generate_draft_responses(emails):
     """
     Generate draft responses for client inquiries and communications.
 
+    Drafts are generated concurrently (up to CONCURRENCY in flight, with
+    an RPM token bucket and a per-request timeout) so wall time is a few
+    round-trips instead of one per email. Each draft streams to
+    .tmp/drafts/ the moment it's ready - partial progress survives a
+    crash and memory stays flat regardless of batch size - so only a
+    lightweight summary entry per draft is kept in memory.
+
     Args:
         emails: List of categorized email objects
 
     Returns:
-        List of draft objects
+        List of draft summary entries (no response bodies)
     """
     openai_key = os.getenv('OPENAI_API_KEY')
 
@@ -163,17 +327,23 @@ def generate_draft_responses(emails):
         raise ValueError("OPENAI_API_KEY not found in .env file")
 
     # Filter emails that need responses
-    client_emails = [
+    client_emails = trim_bodies([
         e for e in emails
-        if e.get('category') in ['new_client_inquiry', 'existing_client']
-    ]
+        if e.get('category') in CATEGORIES_NEEDING_DRAFT
+    ])
 
     print(f"Found {len(client_emails)} client emails requiring draft responses.")
 
-    drafts = []
+    os.makedirs('.tmp/drafts', exist_ok=True)
+
+    sem = asyncio.Semaphore(CONCURRENCY)
+    limiter = RateLimiter(REQUESTS_PER_MINUTE)
+    total = len(client_emails)
+    done = 0
+    write_tasks = []
 
-    for i, email in enumerate(client_emails, 1):
-        print(f"\nGenerating draft {i}/{len(client_emails)}: {email['subject'][:50]}...")
+    async def draft_one(email):
+        nonlocal done
 
         sender_email = extract_sender_email(email['from'])
         is_new_client = email['category'] == 'new_client_inquiry'
@@ -182,81 +352,237 @@ def generate_draft_responses(emails):
         context = None
         if not is_new_client:
             context = load_client_context(sender_email)
-            if context:
-                print(f"  Loaded context for {context.get('client_name', sender_email)}")
-            else:
+            if context is None:
                 print(f"  Warning: No context found for {sender_email}, treating as new client")
                 is_new_client = True
 
-        # Generate response
-        if is_new_client:
-            response_body = generate_new_client_response(email, openai_key)
-        else:
-            response_body = generate_existing_client_response(email, context, openai_key)
-
-        if response_body:
-            draft = {
-                'email_id': email['id'],
-                'in_reply_to_subject': email['subject'],
-                'sender': email['from'],
-                'sender_email': sender_email,
-                'category': email['category'],
-                'draft_response': response_body,
-                'generated_at': datetime.now().isoformat(),
-                'has_context': context is not None
-            }
-
-            drafts.append(draft)
-            print(f"  ✓ Draft generated ({len(response_body)} chars)")
-
-        else:
-            print(f"  ✗ Failed to generate draft")
+        async with sem:
+            await limiter.acquire()
+
+            if is_new_client:
+                coro = generate_new_client_response(email, openai_key)
+            else:
+                coro = generate_existing_client_response(email, context, openai_key)
+
+            response_body = await asyncio.wait_for(coro, REQUEST_TIMEOUT)
+
+        done += 1
+
+        if not response_body:
+            print(f"  ✗ Failed to generate draft ({done}/{total}): {email['subject'][:50]}")
+            return None
+
+        print(f"  ✓ Draft {done}/{total} generated ({len(response_body)} chars): "
+              f"{email['subject'][:50]}")
+
+        draft = {
+            'email_id': email['id'],
+            'in_reply_to_subject': email['subject'],
+            'sender': email['from'],
+            'sender_email': sender_email,
+            'category': email['category'],
+            'draft_response': response_body,
+            'generated_at': datetime.now().isoformat(),
+            'has_context': context is not None
+        }
+
+        # Persist as a background task so the write overlaps with other
+        # in-flight API calls instead of blocking this coroutine
+        write_tasks.append(asyncio.create_task(asyncio.to_thread(save_draft, draft)))
+
+        return {
+            'email_id': email['id'],
+            'subject': email['subject'],
+            'sender': sender_email,
+            'category': email['category']
+        }
+
+    results = await asyncio.gather(
+        *[draft_one(email) for email in client_emails],
+        return_exceptions=True
+    )
+
+    drafts = []
+    for email, result in zip(client_emails, results):
+        if isinstance(result, Exception):
+            print(f"  ✗ Draft for {email['id']} failed: {result}")
+        elif result is not None:
+            drafts.append(result)
+
+    # Make sure every queued draft write has hit disk before returning
+    if write_tasks:
+        await asyncio.gather(*write_tasks)
 
     return drafts
 
+async def generate_draft_responses_batch(emails):
+    """
+    Generate drafts through the OpenAI Batch API instead of live calls.
+
+    Batch requests cost ~50% of real-time pricing and complete within
+    24h - the right trade for non-interactive (e.g. nightly cron) runs.
+    Writes one /v1/chat/completions request per draft to a .jsonl,
+    uploads it, then polls until the batch finishes and fans results
+    back out into the usual per-draft files.
+
+    Args:
+        emails: List of categorized email objects
+
+    Returns:
+        List of draft summary entries (no response bodies)
+    """
+    openai_key = os.getenv('OPENAI_API_KEY')
+
+    if not openai_key:
+        raise ValueError("OPENAI_API_KEY not found in .env file")
+
+    client_emails = trim_bodies([
+        e for e in emails
+        if e.get('category') in CATEGORIES_NEEDING_DRAFT
+    ])
+
+    print(f"Found {len(client_emails)} client emails requiring draft responses.")
+
+    if not client_emails:
+        return []
+
+    client = get_openai_client(openai_key)
+    os.makedirs('.tmp/drafts', exist_ok=True)
+
+    requests_path = '.tmp/draft_batch_requests.jsonl'
+    pending = {}
+
+    with open(requests_path, 'w', encoding='utf-8') as f:
+        for email in client_emails:
+            sender_email = extract_sender_email(email['from'])
+            is_new_client = email['category'] == 'new_client_inquiry'
+
+            context = None
+            if not is_new_client:
+                context = load_client_context(sender_email)
+                if context is None:
+                    is_new_client = True
+
+            if is_new_client:
+                body = {
+                    'model': 'gpt-4o-mini',
+                    'max_tokens': 500,
+                    'messages': build_new_client_messages(email)
+                }
+            else:
+                body = {
+                    'model': 'gpt-4o-mini',
+                    'max_tokens': 600,
+                    'messages': build_existing_client_messages(email, context)
+                }
+
+            f.write(json.dumps({
+                'custom_id': email['id'],
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': body
+            }, ensure_ascii=False) + '\n')
+
+            pending[email['id']] = (email, sender_email, context is not None)
+
+    print(f"Uploading batch of {len(pending)} draft requests...")
+    batch_file = await client.files.create(
+        file=open(requests_path, 'rb'),
+        purpose='batch'
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window='24h'
+    )
+    print(f"Batch {batch.id} submitted; polling every {BATCH_POLL_INTERVAL}s...")
+
+    while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await client.batches.retrieve(batch.id)
+        print(f"  Batch status: {batch.status} "
+              f"({batch.request_counts.completed}/{batch.request_counts.total} done)")
+
+    if batch.status != 'completed' or not batch.output_file_id:
+        print(f"  ✗ Batch finished with status '{batch.status}', no drafts generated")
+        return []
+
+    content = await client.files.content(batch.output_file_id)
+    drafts = []
+
+    for line in content.text.splitlines():
+        result = json.loads(line)
+        email_id = result['custom_id']
+        email, sender_email, has_context = pending[email_id]
+
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            print(f"  ✗ Batch request failed for email {email_id}")
+            continue
+
+        response_body = response['body']['choices'][0]['message']['content'].strip()
+
+        save_draft({
+            'email_id': email_id,
+            'in_reply_to_subject': email['subject'],
+            'sender': email['from'],
+            'sender_email': sender_email,
+            'category': email['category'],
+            'draft_response': response_body,
+            'generated_at': datetime.now().isoformat(),
+            'has_context': has_context
+        })
+
+        drafts.append({
+            'email_id': email_id,
+            'subject': email['subject'],
+            'sender': sender_email,
+            'category': email['category']
+        })
+
+    print(f"\n✓ Batch complete: {len(drafts)}/{len(pending)} drafts generated")
+    return drafts
+
 def save_draft_responses(drafts):
-    """Save draft responses to files."""
+    """Save the draft summary (individual drafts stream to disk as generated)."""
     os.makedirs('.tmp/drafts', exist_ok=True)
 
-    # Save individual drafts
-    for draft in drafts:
-        draft_file = f".tmp/drafts/{draft['email_id']}.json"
-        with open(draft_file, 'w', encoding='utf-8') as f:
-            json.dump(draft, f, indent=2, ensure_ascii=False)
+    counts = Counter(d['category'] for d in drafts)
 
-    # Save summary
     summary = {
         'generated_at': datetime.now().isoformat(),
         'total_drafts': len(drafts),
-        'new_clients': len([d for d in drafts if d['category'] == 'new_client_inquiry']),
-        'existing_clients': len([d for d in drafts if d['category'] == 'existing_client']),
-        'drafts': [
-            {
-                'email_id': d['email_id'],
-                'subject': d['in_reply_to_subject'],
-                'sender': d['sender_email'],
-                'category': d['category']
-            }
-            for d in drafts
-        ]
+        'new_clients': counts['new_client_inquiry'],
+        'existing_clients': counts['existing_client'],
+        'drafts': drafts
     }
 
-    with open('.tmp/draft_responses_summary.json', 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    write_json('.tmp/draft_responses_summary.json', summary)
 
     print(f"\n✓ Saved {len(drafts)} draft responses to .tmp/drafts/")
     print(f"  New client inquiries: {summary['new_clients']}")
     print(f"  Existing client communications: {summary['existing_clients']}")
 
-if __name__ == '__main__':
-    # Load categorized emails
-    emails = load_categorized_emails()
-    print(f"Loaded {len(emails)} categorized emails.")
+def run(emails=None, batch=False):
+    """Generate drafts (loading the cache when none are passed).
 
-    # Generate drafts
-    drafts = generate_draft_responses(emails)
+    batch=True routes through the OpenAI Batch API (~50% cost, up to 24h).
+    """
+    if emails is None:
+        emails = load_categorized_emails()
+        print(f"Loaded {len(emails)} categorized emails.")
+
+    if batch:
+        drafts = asyncio.run(generate_draft_responses_batch(emails))
+    else:
+        drafts = asyncio.run(generate_draft_responses(emails))
 
-    # Save drafts
     save_draft_responses(drafts)
 
     print("\n📝 Review drafts in .tmp/drafts/ before sending!")
+    return drafts
+
+if __name__ == '__main__':
+    import sys
+
+    run(batch='--batch' in sys.argv[1:])
@@ -13,10 +13,24 @@ import json
 import argparse
 import requests
 
+# Shared keep-alive session: repeat calls reuse the TCP connection to
+# the Ollama daemon instead of re-handshaking per request
+_SESSION = requests.Session()
 
-def call_ollama(host, model, messages, format_type=None, timeout=600):
+
+class OllamaError(Exception):
+    """Raised when an Ollama call fails (connection, timeout, bad status)."""
+
+
+def call_ollama(host, model, messages, format_type=None, timeout=600,
+                on_chunk=None, options=None):
     """
-    Call Ollama chat API.
+    Call Ollama chat API, streaming the generation.
+
+    Importable from other scripts as a library function; failures raise
+    OllamaError rather than exiting so callers can fall back. Streaming
+    means the first tokens are available at time-to-first-token instead
+    of after the full generation.
 
     Args:
         host: Ollama API host
@@ -24,42 +38,63 @@ def call_ollama(host, model, messages, format_type=None, timeout=600):
         messages: List of message dicts
         format_type: Optional format (e.g., "json")
         timeout: Request timeout in seconds
+        on_chunk: Optional callable invoked with each content fragment
+                  as it arrives (e.g. for live CLI output)
+        options: Optional Ollama generation options dict
+                 (e.g. {"num_predict": 300, "temperature": 0.1})
 
     Returns:
-        Assistant's response content
+        Assistant's full response content
+
+    Raises:
+        OllamaError: On connection failure, timeout, or non-200 response
     """
     url = f"{host}/api/chat"
 
     payload = {
         "model": model,
         "messages": messages,
-        "stream": False
+        "stream": True
     }
 
     if format_type:
         payload["format"] = format_type
 
-    try:
-        response = requests.post(url, json=payload, timeout=timeout)
+    if options:
+        payload["options"] = options
 
-        if response.status_code != 200:
-            print(f"Error: Ollama returned status {response.status_code}", file=sys.stderr)
-            print(f"Response: {response.text}", file=sys.stderr)
-            sys.exit(1)
+    try:
+        response = _SESSION.post(url, json=payload, timeout=timeout, stream=True)
+    except requests.exceptions.ConnectionError:
+        raise OllamaError(
+            f"Cannot connect to Ollama at {host}. "
+            "Is Ollama running? Try: ollama serve"
+        )
+    except requests.exceptions.Timeout:
+        raise OllamaError(f"Request timed out after {timeout} seconds")
 
-        data = response.json()
-        return data.get("message", {}).get("content", "")
+    if response.status_code != 200:
+        raise OllamaError(
+            f"Ollama returned status {response.status_code}: {response.text}"
+        )
 
-    except requests.exceptions.ConnectionError:
-        print(f"Error: Cannot connect to Ollama at {host}", file=sys.stderr)
-        print("Is Ollama running? Try: ollama serve", file=sys.stderr)
-        sys.exit(1)
+    parts = []
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content", "")
+            if content:
+                parts.append(content)
+                if on_chunk:
+                    on_chunk(content)
+            if chunk.get("done"):
+                break
     except requests.exceptions.Timeout:
-        print(f"Error: Request timed out after {timeout} seconds", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        raise OllamaError(f"Request timed out after {timeout} seconds")
+
+    return "".join(parts)
 
 
 def main():
@@ -113,17 +148,21 @@ Examples:
 
     messages.append({"role": "user", "content": user_prompt})
 
-    # Call Ollama
-    response = call_ollama(
-        host=args.host,
-        model=args.model,
-        messages=messages,
-        format_type=args.format,
-        timeout=args.timeout
-    )
+    # Call Ollama, printing tokens as they arrive
+    try:
+        call_ollama(
+            host=args.host,
+            model=args.model,
+            messages=messages,
+            format_type=args.format,
+            timeout=args.timeout,
+            on_chunk=lambda text: print(text, end='', flush=True)
+        )
+    except OllamaError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
-    # Output only the assistant's response
-    print(response)
+    print()
 
 
 if __name__ == "__main__":
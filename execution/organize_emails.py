@@ -9,32 +9,43 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
 
 import os
 import sys
+import gzip
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import subprocess
 
-def run_script(script_name, args=[]):
+# Stage modules are imported once and called in-process; spawning a
+# fresh interpreter per stage paid ~0.5-1s of startup + SDK imports each
+try:
+    from execution import (
+        fetch_emails,
+        categorize_emails,
+        process_invoices,
+        manage_client_context,
+        generate_draft_responses,
+        apply_gmail_labels,
+    )
+except ImportError:
+    # Running as `python execution/organize_emails.py`: siblings are on sys.path
+    import fetch_emails
+    import categorize_emails
+    import process_invoices
+    import manage_client_context
+    import generate_draft_responses
+    import apply_gmail_labels
+
+def print_stage(name):
     """
 
 import sys
 if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
-Run a Python script and handle errors."""
-    cmd = [sys.executable, script_name] + args
-
+Print the banner for a workflow stage."""
     print(f"\n{'='*60}")
-    print(f"Running: {script_name}")
+    print(f"Running: {name}")
     print(f"{'='*60}\n")
 
-    result = subprocess.run(cmd, capture_output=False, text=True)
-
-    if result.returncode != 0:
-        print(f"\n⚠️  Warning: {script_name} exited with code {result.returncode}")
-        return False
-
-    return True
-
 def generate_final_report():
     """Generate final processing report."""
     report = {
@@ -42,9 +53,14 @@ def generate_final_report():
         'status': 'success'
     }
 
-    # Load categorization results
-    if os.path.exists('.tmp/categorization_results.json'):
-        with open('.tmp/categorization_results.json', 'r') as f:
+    # Load categorization results (plain or gzipped)
+    cat_path = '.tmp/categorization_results.json'
+    if not os.path.exists(cat_path) and os.path.exists(cat_path + '.gz'):
+        cat_path += '.gz'
+
+    if os.path.exists(cat_path):
+        opener = gzip.open if cat_path.endswith('.gz') else open
+        with opener(cat_path, 'rt') as f:
             cat_data = json.load(f)
             report['total_emails'] = cat_data.get('total_emails', 0)
             report['category_counts'] = cat_data.get('category_counts', {})
@@ -112,15 +128,19 @@ def print_final_summary(report):
 
 def main():
     """Main orchestration function."""
-    if len(sys.argv) < 3:
-        print("Usage: python organize_emails.py START_DATE END_DATE [STATUS]")
+    if len([a for a in sys.argv[1:] if a != '--batch']) < 2:
+        print("Usage: python organize_emails.py START_DATE END_DATE [STATUS] [--batch]")
         print("Example: python organize_emails.py 2024-01-01 2024-01-31 all")
         print("\nSTATUS options: all (default), read, unread")
+        print("--batch: generate drafts via the OpenAI Batch API (~50% cost, up to 24h)")
         sys.exit(1)
 
-    start_date = sys.argv[1]
-    end_date = sys.argv[2]
-    status = sys.argv[3] if len(sys.argv) > 3 else 'all'
+    args = [a for a in sys.argv[1:] if a != '--batch']
+    batch_mode = '--batch' in sys.argv[1:]
+
+    start_date = args[0]
+    end_date = args[1]
+    status = args[2] if len(args) > 2 else 'all'
 
     print("\n" + "="*60)
     print("EMAIL ORGANIZATION WORKFLOW")
@@ -130,36 +150,58 @@ def main():
     print("="*60)
 
     # Step 1: Fetch emails
-    success = run_script('execution/fetch_emails.py', [start_date, end_date, status])
-    if not success:
-        print("\n❌ Workflow failed at email fetching step")
+    print_stage('Email fetching')
+    try:
+        emails = fetch_emails.run(start_date, end_date, status)
+    except Exception as e:
+        print(f"\n❌ Workflow failed at email fetching step: {e}")
         sys.exit(1)
 
-    # Step 2: Categorize emails
-    success = run_script('execution/categorize_emails.py')
-    if not success:
-        print("\n❌ Workflow failed at categorization step")
+    # Step 2: Categorize emails (results passed along in memory; the
+    # downstream stages no longer re-read categorization_results.json)
+    print_stage('Email categorization')
+    try:
+        emails = categorize_emails.run(emails)
+    except Exception as e:
+        print(f"\n❌ Workflow failed at categorization step: {e}")
         sys.exit(1)
 
-    # Step 3: Process invoices
-    success = run_script('execution/process_invoices.py')
-    if not success:
-        print("\n⚠️  Invoice processing encountered issues, continuing...")
+    # Steps 3-5: invoices and client contexts only need the
+    # categorized emails, so they run concurrently. Draft generation
+    # reads the context files the context stage writes, so it starts
+    # once contexts complete (still overlapping invoice processing) -
+    # racing them risks torn reads and drafts built on stale contexts.
+    # Labels wait for all three before running.
+    print(f"\n{'='*60}")
+    print("Running invoice, context and draft stages in parallel...")
+    print(f"{'='*60}\n")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        invoice_future = executor.submit(process_invoices.run, emails=emails)
+        context_future = executor.submit(manage_client_context.run, emails=emails)
+
+        try:
+            context_future.result()
+        except Exception as e:
+            print(f"\n⚠️  Client context management encountered issues ({e}), continuing...")
 
-    # Step 4: Manage client contexts
-    success = run_script('execution/manage_client_context.py')
-    if not success:
-        print("\n⚠️  Client context management encountered issues, continuing...")
+        draft_future = executor.submit(
+            generate_draft_responses.run, emails=emails, batch=batch_mode
+        )
 
-    # Step 5: Generate draft responses
-    success = run_script('execution/generate_draft_responses.py')
-    if not success:
-        print("\n⚠️  Draft generation encountered issues, continuing...")
+        for label, future in (('Invoice processing', invoice_future),
+                              ('Draft generation', draft_future)):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"\n⚠️  {label} encountered issues ({e}), continuing...")
 
     # Step 6: Apply Gmail labels
-    success = run_script('execution/apply_gmail_labels.py')
-    if not success:
-        print("\n⚠️  Label application encountered issues, continuing...")
+    print_stage('Gmail label application')
+    try:
+        apply_gmail_labels.run(emails)
+    except Exception as e:
+        print(f"\n⚠️  Label application encountered issues ({e}), continuing...")
 
     # Generate and display final report
     report = generate_final_report()
@@ -8,10 +8,15 @@ if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 import os
+import gzip
 import json
-import base64
+import time
+import binascii
 import re
+import asyncio
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from dotenv import load_dotenv
@@ -19,27 +24,128 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 INVOICE_DIR = os.getenv('INVOICE_DIR', 'invoices')
 
+# Gmail allows up to 100 sub-requests per batch HTTP call
+BATCH_SIZE = 100
+
+# Direct REST downloads in flight at once; stays inside Gmail's
+# per-user 250 quota-units/sec budget
+ATTACHMENT_CONCURRENCY = 20
+
+GMAIL_ATTACHMENT_URL = ('https://gmail.googleapis.com/gmail/v1/users/me/'
+                        'messages/{msg_id}/attachments/{att_id}')
+
+# Invoice heuristics; module-level so the optional automatons below
+# can be built once at import
+
+# Keywords that indicate invoice
+INVOICE_KEYWORDS = [
+    'invoice', 'bill', 'payment', 'receipt', 'statement',
+    'due', 'amount', 'total', 'paid', 'balance'
+]
+
+# Common invoice sender patterns
+INVOICE_SENDERS = [
+    'accounting@', 'billing@', 'invoices@', 'noreply@',
+    'payments@', 'finance@', 'ar@'
+]
+
+def _build_automaton(words):
+    """Compile words into an Aho-Corasick automaton."""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+# Aho-Corasick scans all patterns in one O(len(text)) pass in C,
+# instead of one Python substring search per pattern
+if ahocorasick is not None:
+    _KEYWORD_AUTOMATON = _build_automaton(INVOICE_KEYWORDS)
+    _SENDER_AUTOMATON = _build_automaton(INVOICE_SENDERS)
+else:
+    _KEYWORD_AUTOMATON = _SENDER_AUTOMATON = None
+
+def write_json(output_path, payload):
+    """Write JSON with orjson (C serializer) when available."""
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(
+                payload,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+            ))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+
+def load_json(path, opener=open):
+    """Read JSON with orjson (C parser) when available."""
+    if orjson is not None:
+        with opener(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
 def load_categorized_emails(cache_path='.tmp/categorization_results.json'):
     """Load categorized emails."""
+    if not os.path.exists(cache_path) and os.path.exists(cache_path + '.gz'):
+        cache_path += '.gz'
+
     if not os.path.exists(cache_path):
         raise FileNotFoundError(f"Categorization results not found at {cache_path}")
 
-    with open(cache_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    opener = gzip.open if cache_path.endswith('.gz') else open
+    return load_json(cache_path, opener)['emails']
 
-    return data['emails']
-
-def get_gmail_service():
-    """Get authenticated Gmail service."""
+def get_gmail_credentials():
+    """Load stored Gmail OAuth credentials."""
     token_path = 'token.json'
 
     if not os.path.exists(token_path):
         raise FileNotFoundError("Gmail token not found. Run fetch_emails.py first.")
 
-    creds = Credentials.from_authorized_user_file(token_path)
-    return build('gmail', 'v1', credentials=creds)
+    return Credentials.from_authorized_user_file(token_path)
+
+def get_gmail_service():
+    """Get authenticated Gmail service."""
+    return build('gmail', 'v1', credentials=get_gmail_credentials())
+
+# urlsafe -> standard base64 alphabet, applied byteswise
+_B64_URLSAFE = bytes.maketrans(b'-_', b'+/')
+
+def _write_attachment(b64url_data, output_path):
+    """Decode a urlsafe-base64 payload and write it in one syscall.
+
+    binascii.a2b_base64 on pre-translated bytes is the direct C decode
+    behind urlsafe_b64decode without the wrapper layers, and os.write
+    on a raw fd skips the buffered-writer copy - a multi-MB PDF goes
+    from decoded bytes to disk without an intermediate buffer.
+    """
+    file_data = binascii.a2b_base64(
+        b64url_data.encode('ascii').translate(_B64_URLSAFE)
+    )
+
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, file_data)
+    finally:
+        os.close(fd)
 
 def download_attachment(service, user_id, msg_id, attachment_id, filename, output_dir):
     """Download email attachment."""
@@ -50,14 +156,11 @@ def download_attachment(service, user_id, msg_id, attachment_id, filename, outpu
             id=attachment_id
         ).execute()
 
-        file_data = base64.urlsafe_b64decode(attachment['data'])
-
         # Save file
         os.makedirs(output_dir, exist_ok=True)
         output_path = os.path.join(output_dir, filename)
 
-        with open(output_path, 'wb') as f:
-            f.write(file_data)
+        _write_attachment(attachment['data'], output_path)
 
         print(f"  Downloaded: {filename}")
         return output_path
@@ -66,46 +169,167 @@ def download_attachment(service, user_id, msg_id, attachment_id, filename, outpu
         print(f"  Error downloading {filename}: {e}")
         return None
 
-def extract_month_folder(email_date):
-    """Extract YYYY-MM from email date for folder organization."""
-    try:
-        # Parse common date formats
-        # Example: "Mon, 15 Jan 2024 10:30:00 +0000"
-        date_str = email_date.split(',')[-1].strip() if ',' in email_date else email_date
+def download_attachments_batch(service, jobs):
+    """
+    Download many attachments using batched HTTP requests.
+
+    Groups attachments().get calls into batches of up to 100
+    sub-requests, so a run's PDFs arrive in a handful of HTTPS
+    round-trips instead of one per attachment. Sub-requests that fail
+    inside a batch are retried individually.
+
+    Args:
+        service: Gmail API service
+        jobs: List of (msg_id, attachment_id, filename, output_dir)
+
+    Returns:
+        Dict mapping "msg_id:filename" to the saved path (or None)
+    """
+    by_request_id = {
+        f"{msg_id}:{filename}": (msg_id, att_id, filename, output_dir)
+        for msg_id, att_id, filename, output_dir in jobs
+    }
+    results = {}
+    failed_ids = []
+    last_progress = 0.0
+
+    def callback(request_id, response, exception):
+        nonlocal last_progress
+
+        if exception is not None:
+            failed_ids.append(request_id)
+            return
+
+        _, _, filename, output_dir = by_request_id[request_id]
+
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, filename)
+
+        _write_attachment(response['data'], output_path)
+
+        results[request_id] = output_path
+
+        # Throttled progress: one print per file adds a stdout syscall
+        # to every download
+        now = time.monotonic()
+        if now - last_progress >= 0.1 or len(results) == len(jobs):
+            print(f"  Downloaded {len(results)}/{len(jobs)}: {filename}", end='\r')
+            last_progress = now
+
+    for start in range(0, len(jobs), BATCH_SIZE):
+        chunk = jobs[start:start + BATCH_SIZE]
+        batch = service.new_batch_http_request(callback=callback)
+
+        for msg_id, att_id, filename, output_dir in chunk:
+            batch.add(
+                service.users().messages().attachments().get(
+                    userId='me',
+                    messageId=msg_id,
+                    id=att_id
+                ),
+                request_id=f"{msg_id}:{filename}"
+            )
+
+        batch.execute()
+
+    if results:
+        print()
+
+    # Retry failures one at a time (e.g., transient per-request 4xx)
+    for request_id in failed_ids:
+        msg_id, att_id, filename, output_dir = by_request_id[request_id]
+        results[request_id] = download_attachment(
+            service, 'me', msg_id, att_id, filename, output_dir
+        )
+
+    return results
+
+async def download_attachments_async(creds, jobs):
+    """
+    Download attachments concurrently over direct REST calls.
+
+    BatchHttpRequest still executes one batch round-trip at a time;
+    with aiohttp every attachments().get is its own request, up to
+    ATTACHMENT_CONCURRENCY in flight, so the loop becomes bandwidth-
+    bound rather than RTT-bound. Decoded PDFs are written off-loop via
+    asyncio.to_thread.
 
-        # Try to extract date
-        for fmt in ['%d %b %Y', '%Y-%m-%d', '%d %B %Y']:
-            try:
-                dt = datetime.strptime(date_str.split()[0:3].__str__(), fmt)
-                return dt.strftime('%Y-%m')
-            except:
-                continue
+    Args:
+        creds: Gmail OAuth credentials (refreshed here if expired)
+        jobs: List of (msg_id, attachment_id, filename, output_dir)
+
+    Returns:
+        Dict mapping "msg_id:filename" to the saved path (or None)
+    """
+    if not creds.valid:
+        creds.refresh(Request())
+
+    sem = asyncio.Semaphore(ATTACHMENT_CONCURRENCY)
+    results = {}
+    last_progress = 0.0
+
+    async def fetch(session, msg_id, att_id, filename, output_dir):
+        nonlocal last_progress
+        request_id = f"{msg_id}:{filename}"
+        url = GMAIL_ATTACHMENT_URL.format(msg_id=msg_id, att_id=att_id)
+
+        try:
+            async with sem:
+                async with session.get(url) as resp:
+                    resp.raise_for_status()
+                    payload = await resp.json()
+
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, filename)
+            await asyncio.to_thread(_write_attachment, payload['data'], output_path)
+            results[request_id] = output_path
+
+        except Exception as e:
+            print(f"  Error downloading {filename}: {e}")
+            results[request_id] = None
+            return
+
+        now = time.monotonic()
+        if now - last_progress >= 0.1 or len(results) == len(jobs):
+            print(f"  Downloaded {len(results)}/{len(jobs)}: {filename}", end='\r')
+            last_progress = now
+
+    headers = {'Authorization': f'Bearer {creds.token}'}
+    async with aiohttp.ClientSession(headers=headers) as session:
+        await asyncio.gather(*[fetch(session, *job) for job in jobs])
+
+    if results:
+        print()
 
-        # Fallback to current month
-        return datetime.now().strftime('%Y-%m')
+    return results
 
-    except:
-        return datetime.now().strftime('%Y-%m')
+# Fallback month for unparseable dates; scripts are one-shot, so this
+# is safe to compute once at import
+_CURRENT_MONTH = datetime.now().strftime('%Y-%m')
+
+def extract_month_folder(email_date):
+    """Extract YYYY-MM from email date for folder organization."""
+    # Gmail 'Date' headers are RFC 2822 (e.g. "Mon, 15 Jan 2024
+    # 10:30:00 +0000") - exactly what parsedate_to_datetime handles,
+    # without a strptime format-guessing loop
+    try:
+        return parsedate_to_datetime(email_date).strftime('%Y-%m')
+    except (TypeError, ValueError):
+        return _CURRENT_MONTH
 
 def is_invoice_email(email):
     """Check if email is likely an invoice (heuristics)."""
-    # Keywords that indicate invoice
-    invoice_keywords = [
-        'invoice', 'bill', 'payment', 'receipt', 'statement',
-        'due', 'amount', 'total', 'paid', 'balance'
-    ]
-
-    # Common invoice sender patterns
-    invoice_senders = [
-        'accounting@', 'billing@', 'invoices@', 'noreply@',
-        'payments@', 'finance@', 'ar@'
-    ]
-
     # Check subject and body
     text_to_check = f"{email['subject']} {email['snippet']} {email['from']}".lower()
+    from_field = email['from'].lower()
+
+    if _KEYWORD_AUTOMATON is not None:
+        if next(_KEYWORD_AUTOMATON.iter(text_to_check), None) is not None:
+            return True
+        return next(_SENDER_AUTOMATON.iter(from_field), None) is not None
 
-    has_keyword = any(keyword in text_to_check for keyword in invoice_keywords)
-    has_sender = any(sender in email['from'].lower() for sender in invoice_senders)
+    has_keyword = any(keyword in text_to_check for keyword in INVOICE_KEYWORDS)
+    has_sender = any(sender in from_field for sender in INVOICE_SENDERS)
 
     return has_keyword or has_sender
 
@@ -126,7 +350,11 @@ def process_invoices(emails):
 
     invoice_log = []
     dashboard_invoices = []
+    download_jobs = []
+    pdf_entries = []
 
+    # First pass: build entries and collect every PDF download as a job
+    # so they can all go out in batched HTTP calls below
     for i, email in enumerate(invoice_emails, 1):
         print(f"\nProcessing invoice {i}/{len(invoice_emails)}: {email['subject']}")
 
@@ -150,27 +378,14 @@ def process_invoices(emails):
         }
 
         if pdf_attachments:
-            # Download PDFs
             print(f"  Found {len(pdf_attachments)} PDF attachment(s)")
 
             for att in pdf_attachments:
-                downloaded_path = download_attachment(
-                    service,
-                    'me',
-                    email['id'],
-                    att['attachmentId'],
-                    att['filename'],
-                    output_dir
+                download_jobs.append(
+                    (email['id'], att['attachmentId'], att['filename'], output_dir)
                 )
 
-                if downloaded_path:
-                    invoice_entry['attachments'].append({
-                        'filename': att['filename'],
-                        'path': downloaded_path,
-                        'size': att['size']
-                    })
-
-            invoice_log.append(invoice_entry)
+            pdf_entries.append((invoice_entry, pdf_attachments))
 
         else:
             # No PDF - check if it's a dashboard-only invoice
@@ -190,6 +405,32 @@ def process_invoices(emails):
             else:
                 print("  No PDF and low invoice confidence - skipping")
 
+    # Second pass: download the PDFs and attach the saved paths
+    if download_jobs:
+        print(f"\nDownloading {len(download_jobs)} PDF attachment(s)...")
+
+        if aiohttp is not None:
+            downloaded = asyncio.run(
+                download_attachments_async(get_gmail_credentials(), download_jobs)
+            )
+        else:
+            downloaded = download_attachments_batch(service, download_jobs)
+
+        for invoice_entry, pdf_attachments in pdf_entries:
+            for att in pdf_attachments:
+                downloaded_path = downloaded.get(
+                    f"{invoice_entry['email_id']}:{att['filename']}"
+                )
+
+                if downloaded_path:
+                    invoice_entry['attachments'].append({
+                        'filename': att['filename'],
+                        'path': downloaded_path,
+                        'size': att['size']
+                    })
+
+            invoice_log.append(invoice_entry)
+
     return invoice_log, dashboard_invoices
 
 def save_invoice_logs(invoice_log, dashboard_invoices):
@@ -197,39 +438,39 @@ def save_invoice_logs(invoice_log, dashboard_invoices):
     os.makedirs('.tmp', exist_ok=True)
 
     # Main invoice log
-    with open('.tmp/invoice_log.json', 'w', encoding='utf-8') as f:
-        json.dump({
-            'generated_at': datetime.now().isoformat(),
-            'total_invoices': len(invoice_log),
-            'invoices': invoice_log
-        }, f, indent=2, ensure_ascii=False)
+    write_json('.tmp/invoice_log.json', {
+        'generated_at': datetime.now().isoformat(),
+        'total_invoices': len(invoice_log),
+        'invoices': invoice_log
+    })
 
     print(f"\nSaved {len(invoice_log)} invoice records to .tmp/invoice_log.json")
 
     # Dashboard invoices log
     if dashboard_invoices:
-        with open('.tmp/dashboard_invoices.json', 'w', encoding='utf-8') as f:
-            json.dump({
-                'generated_at': datetime.now().isoformat(),
-                'total_dashboard_invoices': len(dashboard_invoices),
-                'message': 'These invoices require manual download from dashboards/portals',
-                'invoices': dashboard_invoices
-            }, f, indent=2, ensure_ascii=False)
+        write_json('.tmp/dashboard_invoices.json', {
+            'generated_at': datetime.now().isoformat(),
+            'total_dashboard_invoices': len(dashboard_invoices),
+            'message': 'These invoices require manual download from dashboards/portals',
+            'invoices': dashboard_invoices
+        })
 
         print(f"Saved {len(dashboard_invoices)} dashboard invoice records to .tmp/dashboard_invoices.json")
         print("\n⚠️  ACTION REQUIRED: Review dashboard_invoices.json for manual downloads")
 
-if __name__ == '__main__':
-    # Load categorized emails
-    emails = load_categorized_emails()
-    print(f"Loaded {len(emails)} categorized emails.")
+def run(emails=None):
+    """Process invoice emails (loading the cache when none are passed)."""
+    if emails is None:
+        emails = load_categorized_emails()
+        print(f"Loaded {len(emails)} categorized emails.")
 
-    # Process invoices
     invoice_log, dashboard_invoices = process_invoices(emails)
-
-    # Save logs
     save_invoice_logs(invoice_log, dashboard_invoices)
 
     print(f"\n✓ Invoice processing complete!")
     print(f"  PDFs downloaded: {len(invoice_log)}")
     print(f"  Dashboard invoices: {len(dashboard_invoices)}")
+    return invoice_log, dashboard_invoices
+
+if __name__ == '__main__':
+    run()
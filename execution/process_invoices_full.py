@@ -7,6 +7,13 @@ import os
 import sys
 import subprocess
 
+try:
+    from execution import extract_invoice_data, organize_invoices_by_sender
+except ImportError:
+    # Running from inside execution/ directly
+    import extract_invoice_data
+    import organize_invoices_by_sender
+
 def run_script(script_name, args=[]):
     """Run a Python script and handle errors."""
     cmd = [sys.executable, script_name] + args
@@ -25,10 +32,12 @@ def run_script(script_name, args=[]):
 
 def main():
     """Main orchestration function."""
-    import sys
+    # --subprocess restores the old one-interpreter-per-stage behavior
+    args = [a for a in sys.argv[1:] if a != '--subprocess']
+    subprocess_mode = '--subprocess' in sys.argv[1:]
 
     # Get invoice directory (optional argument)
-    invoice_dir = sys.argv[1] if len(sys.argv) > 1 else os.getenv('INVOICE_DIR', 'invoices')
+    invoice_dir = args[0] if args else os.getenv('INVOICE_DIR', 'invoices')
 
     print("\n" + "="*60)
     print("FULL INVOICE PROCESSING WORKFLOW")
@@ -36,16 +45,32 @@ def main():
     print(f"Invoice directory: {invoice_dir}")
     print("="*60)
 
-    # Step 1: Extract invoice data
-    success = run_script('execution/extract_invoice_data.py', [invoice_dir])
-    if not success:
-        print("\n❌ Workflow failed at extraction step")
-        sys.exit(1)
+    if subprocess_mode:
+        # Step 1: Extract invoice data
+        success = run_script('execution/extract_invoice_data.py', [invoice_dir])
+        if not success:
+            print("\n❌ Workflow failed at extraction step")
+            sys.exit(1)
+
+        # Step 2: Organize invoices
+        success = run_script('execution/organize_invoices_by_sender.py')
+        if not success:
+            print("\n⚠️  Organization step encountered issues, but continuing...")
+
+    else:
+        # Step 1: Extract invoice data
+        try:
+            invoices_data = extract_invoice_data.run(invoice_dir)
+        except Exception as e:
+            print(f"\n❌ Workflow failed at extraction step: {e}")
+            sys.exit(1)
 
-    # Step 2: Organize invoices
-    success = run_script('execution/organize_invoices_by_sender.py')
-    if not success:
-        print("\n⚠️  Organization step encountered issues, but continuing...")
+        # Step 2: Organize invoices, reusing the extraction results
+        # in-memory instead of re-reading invoices_metadata.json
+        try:
+            organize_invoices_by_sender.run(invoices_data)
+        except Exception as e:
+            print(f"\n⚠️  Organization step encountered issues, but continuing... ({e})")
 
     print("\n" + "="*60)
     print("FULL INVOICE PROCESSING COMPLETE!")
@@ -0,0 +1,166 @@
+"""
+Local Category Classifier Trainer
+Distills past LLM categorization runs into a small local ONNX model.
+"""
+
+import sys
+if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import os
+import gzip
+import json
+
+try:
+    from execution import categorize_emails
+except ImportError:
+    # Running as `python execution/train_category_classifier.py`
+    import categorize_emails
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+except ImportError:
+    onnx = None
+
+# Fewer labeled emails than this and the model isn't worth shipping
+MIN_EXAMPLES = 200
+
+# Full-batch gradient descent; a linear model on a few thousand
+# hashed-BoW rows converges in seconds
+EPOCHS = 300
+LEARNING_RATE = 0.5
+L2_PENALTY = 1e-4
+
+def load_categorized_emails(cache_path='.tmp/categorization_results.json'):
+    """Load categorized emails (the teacher labels)."""
+    if not os.path.exists(cache_path) and os.path.exists(cache_path + '.gz'):
+        cache_path += '.gz'
+
+    if not os.path.exists(cache_path):
+        raise FileNotFoundError(
+            f"Categorization results not found at {cache_path} - "
+            "run categorize_emails.py first to collect training labels"
+        )
+
+    opener = gzip.open if cache_path.endswith('.gz') else open
+    with opener(cache_path, 'rt', encoding='utf-8') as f:
+        return json.load(f)['emails']
+
+def build_dataset(emails):
+    """Featurize labeled emails with the exact inference featurizer."""
+    category_index = {
+        cat: i for i, cat in enumerate(categorize_emails.LOCAL_CLASSIFIER_CATEGORIES)
+    }
+    labeled = [e for e in emails if e.get('category') in category_index]
+
+    if not labeled:
+        return None, None
+
+    # featurize_email is imported from categorize_emails so the hashing
+    # scheme can never drift between training and inference
+    X = np.vstack([categorize_emails.featurize_email(e) for e in labeled])
+    y = np.array([category_index[e['category']] for e in labeled], dtype=np.int64)
+    return X, y
+
+def train_softmax(X, y, n_classes):
+    """Train a softmax regression with full-batch gradient descent."""
+    n, dim = X.shape
+    weights = np.zeros((dim, n_classes), dtype=np.float32)
+    bias = np.zeros(n_classes, dtype=np.float32)
+    onehot = np.eye(n_classes, dtype=np.float32)[y]
+
+    for epoch in range(EPOCHS):
+        logits = X @ weights + bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        probs = exp / exp.sum(axis=1, keepdims=True)
+
+        grad = (probs - onehot) / n
+        weights -= LEARNING_RATE * (X.T @ grad + L2_PENALTY * weights)
+        bias -= LEARNING_RATE * grad.sum(axis=0)
+
+    accuracy = float((probs.argmax(axis=1) == y).mean())
+    print(f"Trained on {n} emails; training accuracy: {accuracy:.1%}")
+    return weights, bias
+
+def export_onnx(weights, bias, output_path):
+    """Export the linear model as features -> logits ONNX graph.
+
+    classify_local feeds the first input and reads the first output,
+    applying softmax itself, so the graph stops at the logits.
+    """
+    n_classes = bias.shape[0]
+
+    graph = helper.make_graph(
+        [
+            helper.make_node('MatMul', ['features', 'weight'], ['scores']),
+            helper.make_node('Add', ['scores', 'bias'], ['logits']),
+        ],
+        'category_classifier',
+        [helper.make_tensor_value_info(
+            'features', TensorProto.FLOAT,
+            [None, categorize_emails.LOCAL_FEATURE_DIM])],
+        [helper.make_tensor_value_info(
+            'logits', TensorProto.FLOAT, [None, n_classes])],
+        [numpy_helper.from_array(weights, name='weight'),
+         numpy_helper.from_array(bias, name='bias')]
+    )
+
+    model = helper.make_model(
+        graph, opset_imports=[helper.make_opsetid('', 13)]
+    )
+    onnx.checker.check_model(model)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    onnx.save(model, output_path)
+
+def quantize_int8(model_path):
+    """Quantize weights to int8 in place (skipped without onnxruntime)."""
+    try:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError:
+        print("onnxruntime not installed; keeping the float32 model")
+        return
+
+    tmp_path = model_path + '.int8'
+    quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, model_path)
+    print("Quantized weights to int8")
+
+def run():
+    """Train the local classifier from cached categorization results."""
+    if np is None:
+        raise ImportError("numpy is required for training (pip install numpy)")
+    if onnx is None:
+        raise ImportError("onnx is required for export (pip install onnx)")
+
+    print("Loading categorization results...")
+    emails = load_categorized_emails()
+
+    X, y = build_dataset(emails)
+
+    if X is None or len(X) < MIN_EXAMPLES:
+        found = 0 if X is None else len(X)
+        print(f"Only {found} labeled emails available "
+              f"(need {MIN_EXAMPLES}); run more categorization passes first.")
+        return
+
+    weights, bias = train_softmax(
+        X, y, len(categorize_emails.LOCAL_CLASSIFIER_CATEGORIES)
+    )
+
+    output_path = categorize_emails.LOCAL_CLASSIFIER_PATH
+    export_onnx(weights, bias, output_path)
+    quantize_int8(output_path)
+
+    print(f"\n✓ Saved local classifier to {output_path}")
+    print("  categorize_emails.py will now use it for high-confidence emails")
+
+if __name__ == '__main__':
+    run()